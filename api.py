@@ -0,0 +1,185 @@
+"""Read-only JSON API over the aggregates of the prepared dataset, and cohort downloads.
+
+Runs inside the Streamlit process (started by app.py) or on its own:
+
+    python api.py --port 8502
+
+Endpoints, all accepting ``?exclude_outliers=true``:
+
+    /salaries/by-country-year
+    /salaries/company-size-difference
+    /value-counts/<column>
+    /export/<cohort>.<csv|parquet>
+
+Exports are streamed with chunked transfer encoding as ``export.iter_export`` produces them.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import pipeline
+from cache import _hash, module_version
+from export import COHORTS, FORMATS, iter_export
+
+DEFAULT_PORT = int(os.environ.get('DS_API_PORT', 8502))
+# Where browsers reach the API, if it is proxied or not on the same host as them
+PUBLIC_URL = os.environ.get('DS_API_URL')
+VALUE_COUNT_COLUMNS = ['experience_level', 'employment_type', 'job_title_canonical', 'employee_residence', 'remote_ratio', 'company_size', 'work_year']
+
+
+def _by_country_year(exclude_outliers: bool):
+    agg = pipeline.aggregates(pipeline.SOURCE, exclude_outliers=exclude_outliers)
+    return agg['salary_by_country_year'].to_dict('records')
+
+
+def _company_size_difference(exclude_outliers: bool):
+    agg = pipeline.aggregates(pipeline.SOURCE, exclude_outliers=exclude_outliers)
+    return {
+        'seniors_and_directors': agg['change_sen_dir'],
+        'juniors_and_middles': agg['change_jun_mid'],
+    }
+
+
+def _value_counts(exclude_outliers: bool, column: str):
+    df = pipeline.analysis_frame(pipeline.SOURCE, exclude_outliers=exclude_outliers)
+    counts = df[column].value_counts()
+    return [{'value': value, 'count': count} for value, count in zip(counts.index.tolist(), counts.tolist())]
+
+
+# Each route with the stage it reads, whose key covers the data and the code behind the response
+ROUTES = {
+    ('salaries', 'by-country-year'): (pipeline.aggregates, _by_country_year),
+    ('salaries', 'company-size-difference'): (pipeline.aggregates, _company_size_difference),
+    **{('value-counts', column): (pipeline.analysis_frame, lambda exclude_outliers, column=column: _value_counts(exclude_outliers, column)) for column in VALUE_COUNT_COLUMNS},
+}
+VERSION = module_version(__name__)
+
+
+def export_url(cohort: str, fmt: str = 'csv', exclude_outliers: bool = False) -> str:
+    query = urlencode({'exclude_outliers': 'true'}) if exclude_outliers else ''
+    base_url = PUBLIC_URL or f'http://localhost:{DEFAULT_PORT}'
+    return f'{base_url}/export/{cohort}.{fmt}' + (f'?{query}' if query else '')
+
+
+def _parse_export(route: tuple):
+    """The cohort and format of an ``/export/<cohort>.<fmt>`` route, or None for other routes."""
+    if len(route) != 2 or route[0] != 'export':
+        return None
+    cohort, _, fmt = route[1].rpartition('.')
+    if cohort not in COHORTS or fmt not in FORMATS:
+        return None
+    return cohort, fmt
+
+
+class ResponseCache:
+    """Serialized responses with their ETags, one entry per route and parameters.
+
+    The ETag hashes the key of the stage a route reads together with the API code, so it
+    changes with the data, any pipeline code and library version the stage key covers,
+    and the route itself. An entry whose ETag no longer matches is computed again.
+    """
+
+    def __init__(self):
+        self._responses = {}
+        self._lock = threading.Lock()
+
+    def get(self, route: tuple, exclude_outliers: bool) -> tuple:
+        stage, fn = ROUTES[route]
+        key = (route, exclude_outliers)
+        etag = '"' + _hash(stage.key(pipeline.SOURCE, exclude_outliers=exclude_outliers), VERSION, key)[:32] + '"'
+        with self._lock:
+            if self._responses.get(key, (None,))[0] == etag:
+                return self._responses[key]
+
+        body = json.dumps(fn(exclude_outliers)).encode()
+        with self._lock:
+            self._responses[key] = (etag, body)
+        return etag, body
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    responses_cache = ResponseCache()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        route = tuple(part for part in url.path.split('/') if part)
+        export = _parse_export(route)
+        if route not in ROUTES and export is None:
+            return self._send(404, json.dumps({'error': f'unknown endpoint {url.path}'}).encode())
+
+        exclude_outliers = parse_qs(url.query).get('exclude_outliers', ['false'])[0].lower() in ('1', 'true', 'yes')
+        try:
+            if export is not None:
+                df = pipeline.analysis_frame(pipeline.SOURCE, exclude_outliers=exclude_outliers)
+            else:
+                etag, body = self.responses_cache.get(route, exclude_outliers)
+        except Exception:
+            # Answer instead of dropping the connection, the traceback goes where the server logs errors
+            traceback.print_exc()
+            return self._send(500, json.dumps({'error': f'failed to build {url.path}'}).encode())
+
+        if export is not None:
+            return self._send_export(df, *export)
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            return self._send(304, b'', etag)
+        self._send(200, body, etag)
+
+    def _send(self, status: int, body: bytes, etag: str = None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if status != 304:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_export(self, df, cohort: str, fmt: str):
+        self.send_response(200)
+        self.send_header('Content-Type', FORMATS[fmt][1])
+        self.send_header('Content-Disposition', f'attachment; filename="{cohort}.{fmt}"')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for data in iter_export(df, cohort, fmt):
+                if data:
+                    self.wfile.write(b'%X\r\n%s\r\n' % (len(data), data))
+        except Exception:
+            # Without the last chunk the client sees a truncated download rather than a complete file
+            self.close_connection = True
+            raise
+        self.wfile.write(b'0\r\n\r\n')
+
+    def log_message(self, format, *args):
+        # Polling clients would flood the Streamlit log
+        pass
+
+
+def serve_in_background(port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    server.serve_forever()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,104 +1,127 @@
+import inspect
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import pycountry
-import numpy as np
+
+import api
+import pipeline
+from cells import Notebook
+import export
+from export import COHORTS, FORMATS
+from pipeline import ALL, EMPLOYMENT_TYPE_MAPPING, EXPERIENCE_LEVEL_MAPPING, GROWTH_DIMENSIONS, SOURCE
+from salary_model import FEATURES, MicroBatcher, SalaryModel, load_or_train
 
 st.set_page_config(page_title="Data Science Salaries Analysis")
 
-# Loading data
-@st.cache_data
-def load_data():
-    df = pd.read_csv('ds_salaries.csv', sep=';')
-    return df
+# Salary model is trained once per dataset version and shared by all sessions
+@st.cache_resource(max_entries=1)
+def load_salary_model(fingerprint: str) -> SalaryModel:
+    return load_or_train(SOURCE.path)
+
+# One batching worker per process, scoring with the model of the current dataset version
+@st.cache_resource
+def start_salary_estimator() -> MicroBatcher:
+    return MicroBatcher(None)
+
+def load_salary_estimator(fingerprint: str) -> MicroBatcher:
+    salary_estimator = start_salary_estimator()
+    salary_estimator.score_fn = load_salary_model(fingerprint).predict
+    return salary_estimator
 
-df = load_data()
+# JSON API for other tools, one server per process shared by all sessions
+@st.cache_resource
+def start_api(port: int):
+    try:
+        return api.serve_in_background(port)
+    except OSError:
+        # Another app process already serves the API on this port
+        return None
+
+api_server = start_api(api.DEFAULT_PORT)
+
+exclude_outliers = st.sidebar.checkbox('Exclude outliers', help='Hide rows flagged as outliers within their experience level, company size and remote ratio cohort from every chart and hypothesis test.')
+
+# Every nb.cell both shows its code and runs it. Cells are cached under a key derived from
+# their code and everything they read, so a rerun only executes the cells below a change.
+# The data itself is prepared by the stages of pipeline.py, the single definition also used
+# by the API and the export, so cells that only call a stage are not cached a second time.
+nb = Notebook(inputs={'exclude_outliers': exclude_outliers})
+
+def show_step(step):
+    # The pipeline runs this exact code, the app only displays it
+    st.code(inspect.getsource(step).strip('\n'))
 
 # Descriptive statistics
 st.title("Data Science Salaries Analysis")
 
 st.subheader('Importing libraries')
-st.code('''
+nb.cell('''
 import pandas as pd
 import plotly.express as px
-import pycountry
+
+from api import export_url
+from export import iter_export
+from pipeline import EMPLOYMENT_TYPE_MAPPING, EXPERIENCE_LEVEL_MAPPING, SOURCE
+from pipeline import aggregates, analysis_frame, cohort_growth, growth_figure, profile, transformed_frame
 ''')
 
 st.subheader('Data')
 st.text('Loading data')
-st.code('''
-df = pd.read_csv('ds_salaries.csv', sep=';')
-''')
+show_step(pipeline.raw_frame.fn)
+
+st.write("The descriptive statistics below come from a profile of every column, built in one pass over the data and cached with it:")
+show_step(pipeline.profile_frame)
+nb.cell('''
+column_profile = profile(SOURCE)
+''', cache=False)
 
 st.subheader("Dataset Structure")
 st.text('Let us have a look at dataset structure:')
-st.code('''df.head()''')
-st.write(df.head())
+nb.cell("column_profile['head']")
 
 st.text("Looking for NaN data")
-st.code('df.isna().sum()')
-st.write(df.isna().sum())
+nb.cell("column_profile['null_counts']")
 st.write("From the results above we can see, that dataset does not have none cells which means that it is already **cleaned up**.")
 
 st.subheader("Descriptive Statistics")
 st.write("Checking the description of dataset and numeric columns:")
-st.code('df.describe()')
-st.write(df.describe())
+nb.cell("column_profile['describe']")
 
 st.subheader("Salary in USD Description")
 st.write("Checking the description of column `salary_in_usd`:")
-st.code("df['salary_in_usd'].describe()")
-st.write(df['salary_in_usd'].describe())
+nb.cell("column_profile['summaries']['salary_in_usd']")
 st.write("We got mean salary value in USD which ≈ $112 297")
 
 
 st.write("Checking the description of col `job_title`:")
-st.write("To get information about job titles I have to add numeric column for it:")
-
-def convert_job_titles(title: str) -> int:
-    job_titles_dict = {title: idx + 1 for idx, title in enumerate(df['job_title'].unique().tolist())}
-    return job_titles_dict[title]
-
-df['job_title_numeric'] = df['job_title'].apply(convert_job_titles)
-
-st.code('''
-def convert_job_titles(title: str) -> int:
-    job_titles_dict = {title: idx + 1 for idx, title in enumerate(df['job_title'].unique().tolist())}
-    return job_titles_dict[title]
-
-df['job_title_numeric'] = df['job_title'].apply(convert_job_titles)
-''')
-
-st.code('''df.head()''')
-st.write(df.head())
-
+st.write("Column `job_title` contains near-duplicates such as `ML Engineer`, `Machine Learning Engineer` and `Lead Machine Learning Engineer`. So first I map every distinct title to the closest title of a canonical taxonomy, and to get information about job titles I also add a numeric column for it:")
+show_step(pipeline.add_job_title_columns)
 
-st.code('''
-median_job_title = df['job_title_numeric'].median()
-median_job_title
-''')
-median_job_title = df['job_title_numeric'].median()
-st.write(median_job_title)
+st.write("This is the first of the transformation steps below. The pipeline applies all of them to a copy of the raw data:")
+show_step(pipeline.transformed_frame.fn)
+nb.cell('''
+df = transformed_frame(SOURCE)
+''', cache=False)
 
-st.text('Let us create a function to convert numeric value back:')
+nb.cell("df[['job_title', 'job_title_canonical']].drop_duplicates()")
+n_titles, n_canonical_titles = nb.cell("column_profile['cardinality']['job_title'], df['job_title_canonical'].nunique()").value
+st.write(f"It reduces {n_titles} raw titles to {n_canonical_titles} canonical ones.")
 
-st.code('''
-def convert_job_titles_to_text(title: int) -> str:
-    job_titles_dict = {idx + 1: title for idx, title in enumerate(df['job_title'].unique().tolist())}
-    return job_titles_dict[title]''')
+nb.cell('''df[['job_title_canonical', 'job_title_numeric']].head()''')
 
-def convert_job_titles_to_text(title: int) -> str:
-    job_titles_dict = {idx + 1: title for idx, title in enumerate(df['job_title'].unique().tolist())}
-    return job_titles_dict[title]
+st.write("The median job title and the other aggregates below are computed by one more stage:")
+nb.cell('''
+agg = aggregates(SOURCE, exclude_outliers=exclude_outliers)
+''', cache=False)
 
+nb.cell("agg['median_job_title']")
 
+st.text('Converting the numeric value back to the title:')
 
-st.code('convert_job_titles_to_text(median_job_title)')
-st.write(convert_job_titles_to_text(median_job_title))
+nb.cell("agg['median_job_title_text']")
 
-st.write('It can be seen that on average the position of programmers in dataset is `Business Data Analyst`.')
-st.code("df['employee_residence'].describe()")
-st.write(df['employee_residence'].describe())
+st.write(f"It can be seen that on average the position of programmers in dataset is `{nb['agg']['median_job_title_text']}`.")
+nb.cell("column_profile['summaries']['employee_residence']")
 st.text('Now we know that the most popular residence for work is United States ')
 
 
@@ -109,8 +132,7 @@ st.write('''
 - 100 - Fully remote
          ''')
 
-st.code("df['remote_ratio'].value_counts()")
-st.write(df['remote_ratio'].value_counts())
+nb.cell("column_profile['value_counts']['remote_ratio']")
 st.text('We can conclude that most of employees works remotely')
 
 
@@ -118,40 +140,12 @@ st.text('We can conclude that most of employees works remotely')
 st.subheader("Data Transformation")
 
 st.write("Let us drop the column `salary_currency`. This information is redundant because it is more convenient to evaluate the salary in USD (which already exists in the dataset as a separate column `salary_in_usd`).")
-st.code("df.drop(columns='salary_currency', inplace=True)")
-df.drop(columns='salary_currency', inplace=True)
-
-st.code('df.head()')
-st.write(df.head())
-
-
 st.write("Also let us drop the coloumn `salary`. As it was mentioned before I will evaluate the salary in USD.")
-st.code("df.drop(columns='salary', inplace=True)")
-df.drop(columns='salary', inplace=True)
-
-st.code('df.head()')
-st.write(df.head())
-
-st.text('As you can see columns dropped successfully.')
+show_step(pipeline.drop_local_salary)
 
 st.write("In my dataset I have a column `employee_residence` which contains country name in ISO-3166 format. It will be used for the country plot which takes ISO-3 format of the country name. So I need to convert it to the desired format for proper handling.")
 
-
-def convert_country_name(country_name: str) -> str:
-    return pycountry.countries.get(alpha_2=country_name).alpha_3
-
-st.code('''
-def convert_country_name(country_name: str) -> str:
-    return pycountry.countries.get(alpha_2=country_name).alpha_3
-''')
-
-st.code("df['employee_residence_iso_3'] = df['employee_residence'].apply(convert_country_name)")
-df['employee_residence_iso_3'] = df['employee_residence'].apply(convert_country_name)
-st.code('df.head()')
-st.write(df.head())
-
-
-st.write("We can see that there is a new column `employee_residence_iso_3` with the correct format.")
+show_step(pipeline.add_residence_iso_3)
 
 
 st.write("Let us convert columns `experience_level` and `employment_type` to more convenient to understand names.")
@@ -163,8 +157,7 @@ st.write('''`experience_level:`
 - SE - Senior 
 - EX - Director
 ''')
-st.code("df['experience_level'].value_counts()")
-st.write(df['experience_level'].value_counts())
+nb.cell("column_profile['value_counts']['experience_level']")
 
 
 st.write('''
@@ -175,68 +168,43 @@ st.write('''
 - FL - Freelance
 ''')
 
-st.code("df['employment_type'].value_counts()")
-st.write(df['employment_type'].value_counts())
-
-st.code('''
-
-experience_level_mapping = {
-    'EN': 'Junior',
-    'MI': 'Middle',
-    'SE': 'Senior',
-    'EX': 'Director'
-}
+nb.cell("column_profile['value_counts']['employment_type']")
 
-employment_type_mapping = {
-    'PT': 'Part-time',
-    'FT': 'Full-time',
-    'CT': 'Contract',
-    'FL': 'Freelance'
-}
-
-
-df['experience_level'] = df['experience_level'].replace(experience_level_mapping)
-df['employment_type'] = df['employment_type'].replace(employment_type_mapping)
+nb.cell('''
+EXPERIENCE_LEVEL_MAPPING, EMPLOYMENT_TYPE_MAPPING
 ''')
+show_step(pipeline.rename_codes)
 
-# Convert experience_level and employment_type to more understandable names
-experience_level_mapping = {
-    'EN': 'Junior',
-    'MI': 'Middle',
-    'SE': 'Senior',
-    'EX': 'Director'
-}
-
-employment_type_mapping = {
-    'PT': 'Part-time',
-    'FT': 'Full-time',
-    'CT': 'Contract',
-    'FL': 'Freelance'
-}
-
-df['experience_level'] = df['experience_level'].replace(experience_level_mapping)
-df['employment_type'] = df['employment_type'].replace(employment_type_mapping)
-
-st.code('df.head()')
-st.write(df.head())
-st.write("We can see that now we have all the modifications done correctly.")
+nb.cell('df.head()')
+st.write("We can see that the columns `salary_currency` and `salary` dropped successfully and there is a new column `employee_residence_iso_3` with the correct format. So, now we have all the modifications done correctly.")
 
 
 st.write('`experience_level`')
-st.code("df['experience_level'].value_counts()")
-st.write(df['experience_level'].value_counts())
+nb.cell("df['experience_level'].value_counts()")
 
 
 st.write('`employment_type`')
-st.code("df['employment_type'].value_counts()")
-st.write(df['employment_type'].value_counts())
+nb.cell("df['employment_type'].value_counts()")
+
+# Outliers
+st.subheader("Outliers")
+st.write("Before plotting, let us flag salary outliers. A salary is an outlier if it lies outside the IQR fences (1.5 × IQR beyond the quartiles) or has a modified z-score above 3.5 (based on the median absolute deviation) within its cohort of `experience_level`, `company_size` and `remote_ratio`:")
+st.write("The flags are kept next to the data and only recomputed for the cohorts new rows fall into. The transformation stage joins them to the frame:")
+show_step(pipeline.outlier_flags.fn)
+nb.cell("df['is_outlier'].value_counts()")
+
+st.write("Use the **Exclude outliers** toggle in the sidebar to drop the flagged rows from every chart and hypothesis test below.")
+show_step(pipeline.analysis_frame.fn)
+nb.cell('''
+df = analysis_frame(SOURCE, exclude_outliers=exclude_outliers)
+''', cache=False)
 
 # Simple Plots
 st.subheader("Simple Plots")
 
 # Salary Distribution
 st.text("Distribution of employees' salary")
-st.code('''
+nb.cell('''
 salaries_dist = px.box(
     df,
     x='salary_in_usd',
@@ -262,39 +230,12 @@ salaries_dist.update_layout(
     )
 )
 ''')
-
-salaries_dist = px.box(
-    df,
-    x='salary_in_usd',
-    title='Salary Distribution',
-    labels={'remote_ratio': 'Salary (USD)'},
-    template='plotly_white'
-)
-
-salaries_dist.update_traces(
-    marker_color='blue',
-)
-
-salaries_dist.update_layout(
-    title_font_size=16,
-    xaxis_title='Salary (USD)',
-    xaxis=dict(
-        showgrid=True,  
-        gridcolor='lightgray'  
-    ),
-    yaxis=dict(
-        showgrid=True,  
-        gridcolor='lightgray' 
-    )
-)
-
-st.plotly_chart(salaries_dist)
 st.text('We can see that median salary is about $100 000 and there some data outliers.')
 
 # Most Popular Positions
 st.text("Now let's check the most popular positions of programmers in this dataset:")
-st.code('''
-experience_level = df['experience_level'].value_counts()
+nb.cell('''
+experience_level = agg['experience_level']
 popular_positions = px.pie(
     values=experience_level,
     names=experience_level.index.to_list(),
@@ -306,40 +247,19 @@ popular_positions.update_layout(
     width=600
 )
 ''')
-
-experience_level = df['experience_level'].value_counts()
-popular_positions = px.pie(
-    values=experience_level,
-    names=experience_level.index.to_list(),
-    template='plotly_white'
-)
-
-popular_positions.update_layout(
-    title='The most popular positions',
-    width=600
-)
-
-st.plotly_chart(popular_positions)
 st.text('It occurs that the most popular position (employee level) is Senior and second most popular is Middle')
 
 # Most Popular Countries
 st.text("Now look for the most popular countries among programmers for work:")
-st.code("df['employee_residence'].value_counts()")
-st.write(df['employee_residence'].value_counts())
+nb.cell("agg['employee_residence_counts']")
 
 st.write("Since I have a lot of countries in which there are less than 5 programmers I will create a separate field for them called: `Other`")
-st.code('''
-country_counts = df['employee_residence_iso_3'].value_counts()
-low_count_countries = country_counts[country_counts < 5].index
-df['employee_residence_grouped'] = df['employee_residence_iso_3'].apply(lambda x: 'Less than 5 employees per country' if x in low_count_countries else x)
-'''
-)
-st.code('df.head()')
-st.write(df.head())        
+show_step(pipeline.group_rare_countries)
+nb.cell('df.head()')
 
 
-st.code('''
-employee_residence = df['employee_residence_grouped'].value_counts()
+nb.cell('''
+employee_residence = agg['employee_residence']
 top_countries = px.pie(
     values=employee_residence,
     names=employee_residence.index.to_list(),
@@ -352,37 +272,10 @@ top_countries.update_layout(
 )
 ''')
 
-country_counts = df['employee_residence_iso_3'].value_counts()
-low_count_countries = country_counts[country_counts < 5].index
-df['employee_residence_grouped'] = df['employee_residence_iso_3'].apply(lambda x: 'Less than 5 employees per country' if x in low_count_countries else x)
-
-employee_residence = df['employee_residence_grouped'].value_counts()
-top_countries = px.pie(
-    values=employee_residence,
-    names=employee_residence.index.to_list(),
-    template='plotly_white'
-)
-
-top_countries.update_layout(
-    title='Residence of work',
-    width=600
-)
-
-st.plotly_chart(top_countries)
-
 # Salaries in Residence of Work Countries
 st.text("Plot mean of salaries in residence of work countries:")
-st.code('''
-aggregated_salaries = df.groupby('employee_residence_grouped')['salary_in_usd'].mean().reset_index()
-salaries = px.bar(
-    aggregated_salaries,
-    x='employee_residence_grouped',
-    y='salary_in_usd',
-    template='plotly_white'
-)
-''')
-
-aggregated_salaries = df.groupby('employee_residence_grouped')['salary_in_usd'].mean().reset_index()
+nb.cell('''
+aggregated_salaries = agg['aggregated_salaries']
 salaries = px.bar(
     aggregated_salaries,
     x='employee_residence_grouped',
@@ -390,13 +283,14 @@ salaries = px.bar(
     template='plotly_white'
 )
 
-st.plotly_chart(salaries)
+salaries
+''')
 st.text('Here, the biggest mean salaies are in United States, Japan and Canada.')
 
 # Salary Change from 2020 to 2022
 st.text("Plot salary change from 2020 to 2022:")
-st.code('''
-salary_by_year = df.groupby('work_year')['salary_in_usd'].mean().reset_index()
+nb.cell('''
+salary_by_year = agg['salary_by_year']
 salaries = px.line(
     salary_by_year,
     x='work_year',
@@ -417,30 +311,37 @@ salaries.update_layout(
     ),
 )
 ''')
+st.write("On the graph we can see a **increase** in salaries during the years.")
 
-salary_by_year = df.groupby('work_year')['salary_in_usd'].mean().reset_index()
-salaries = px.line(
-    salary_by_year,
-    x='work_year',
-    y='salary_in_usd',
-    title='Average Salary Change from 2020 to 2022',
-    labels={'work_year': 'Year', 'salary_in_usd': 'Average Salary (USD)'},
-    markers=True,
-    template='plotly_white'
-)
+# Salary Growth by Cohort
+st.text("The global line hides how different cohorts changed. Let us compute year-over-year growth for every cohort:")
+nb.cell('''
+growth = cohort_growth(df)
+''')
 
-salaries.update_layout(
-    title_font_size=18,
-    xaxis_title='Year',
-    yaxis_title='Average Salary (USD)',
-    xaxis=dict(
-        tickmode='linear',
-        dtick=1
-    ),
+growth = nb['growth']
+cohort_labels = {
+    'experience_level': 'Cohort: Experience Level',
+    'employment_type': 'Cohort: Employment Type',
+    'company_size': 'Cohort: Company Size',
+    'remote_ratio': 'Cohort: Remote Ratio',
+    'employee_residence': 'Cohort: Residence',
+}
+cohort_columns = st.columns(len(GROWTH_DIMENSIONS))
+nb.inputs['selected_cohort'] = tuple(
+    # Index levels are ordered by the original values, with ALL last
+    column.selectbox(cohort_labels[dim], [ALL] + [value for value in growth.index.unique(dim).sort_values() if value != ALL])
+    for column, dim in zip(cohort_columns, GROWTH_DIMENSIONS)
 )
 
-st.plotly_chart(salaries)
-st.write("On the graph we can see a **increase** in salaries during the years.")
+if nb.inputs['selected_cohort'] in growth.index:
+    nb.cell('''
+cohort = growth.loc[selected_cohort]
+growth_figure(cohort)
+''')
+    nb.cell('cohort')
+else:
+    st.write("There are no employees in this cohort.")
 
 # Salary Distribution by Company Size
 st.subheader("Salary distribution by company size")
@@ -448,8 +349,7 @@ st.write("We have 3 types of companies:")
 st.write("* **L** - large company (more than 250 employees)")
 st.write("* **M** - medium company (from 50 to 250 employees)")
 st.write("* **S** - small company (up to 50 employees)")
-st.code('''
-filtered_companies_by_size = df.groupby('company_size')['salary_in_usd'].median()
+nb.cell('''
 salaries_dist_violin = px.violin(
     df,
     x='company_size',
@@ -468,53 +368,19 @@ salaries_dist_violin.update_layout(
     )
 )
 ''')
-
-filtered_companies_by_size = df.groupby('company_size')['salary_in_usd'].median()
-salaries_dist_violin = px.violin(
-    df,
-    x='company_size',
-    y='salary_in_usd',
-    title="Salary Distribution by Company Size",
-    labels={'company_size': 'Company Size', 'salary_in_usd': 'Salary (USD)'},
-    box=True,
-    points="all",
-    template='plotly_white'
-)
-
-salaries_dist_violin.update_layout(
-    xaxis=dict(
-        categoryorder='array',
-        categoryarray=['S', 'M', 'L']
-    )
-)
-
-st.plotly_chart(salaries_dist_violin)
 st.write("- Maximum median of salary is in M companies")
 st.write("- Maximum of salary reached in L companies")
 st.write("- Maximum people with median salary in S companies")
 
 # Detailed Overview via Complex Plots
 st.subheader("Detailed Overview via Complex Plots")
-st.write("More informative plot of distribution of programmers by `experience_level`, `employment_type` and `job_title`:")
+st.write("More informative plot of distribution of programmers by `experience_level`, `employment_type` and `job_title_canonical`:")
 
 # Sunburst Plot
-st.code('''
-sunburst_plot = px.sunburst(
-    df,
-    path=['experience_level', 'employment_type', 'job_title'],
-    values='salary_in_usd',
-    color='salary_in_usd',
-    color_continuous_scale='RdBu',
-    title='Salaries by Experience, Employment Type, and Job Title',
-    width=1000,
-    height=800,
-    template='plotly_white'
-)
-''')
-
+nb.cell('''
 sunburst_plot = px.sunburst(
     df,
-    path=['experience_level', 'employment_type', 'job_title'],
+    path=['experience_level', 'employment_type', 'job_title_canonical'],
     values='salary_in_usd',
     color='salary_in_usd',
     color_continuous_scale='RdBu',
@@ -524,11 +390,12 @@ sunburst_plot = px.sunburst(
     template='plotly_white'
 )
 
-st.plotly_chart(sunburst_plot)
+sunburst_plot
+''')
 
 # Salary Distribution by Experience Level and Remote Ratio
 st.text("Salary Distribution by Experience Level and Remote Ratio")
-st.code('''
+nb.cell('''
 salaries_dist_2 = px.box(
     df,
     x='experience_level',
@@ -547,31 +414,11 @@ salaries_dist_2.update_layout(
     )
 )
 ''')
-
-salaries_dist_2 = px.box(
-    df,
-    x='experience_level',
-    y='salary_in_usd',
-    color='employment_type',
-    facet_col='remote_ratio',
-    title='Salary Distribution by Experience Level and Remote Ratio',
-    labels={'experience_level': 'Experience Level', 'salary_in_usd': 'Salary (USD)', 'employment_type': 'Employment Type'},
-    template='plotly_white'
-)
-
-salaries_dist_2.update_layout(
-    xaxis=dict(
-        categoryorder='array',
-        categoryarray=['Junior', 'Middle', 'Senior', 'Director']
-    )
-)
-
-st.plotly_chart(salaries_dist_2)
 st.write("Employees who have `remote_ratio = 0` (work from office) mostly work Full-Time.")
 
 # 3D Scatter Plot
 st.text("Let us view this graphs in 3D")
-st.code('''
+nb.cell('''
 salaries_dist_2_cube = px.scatter_3d(
     df,
     x='remote_ratio',
@@ -596,53 +443,10 @@ salaries_dist_2_cube.update_layout(
 )
 ''')
 
-salaries_dist_2_cube = px.scatter_3d(
-    df,
-    x='remote_ratio',
-    y='salary_in_usd',
-    z='experience_level',
-    color='experience_level',
-    size='salary_in_usd',
-    title='Salary vs Remote Ratio and Experience Level',
-    labels={'remote_ratio': 'Remote Ratio (%)', 'salary_in_usd': 'Salary (USD)', 'experience_level': 'Experience Level'},
-    width=1200,
-    height=800,
-    template='plotly_white'
-)
-
-salaries_dist_2_cube.update_layout(
-    scene=dict(
-        zaxis=dict(
-            categoryorder='array',
-            categoryarray=['Junior', 'Middle', 'Senior', 'Director']
-        )
-    )
-)
-
-st.plotly_chart(salaries_dist_2_cube)
-
 # Distribution of Employees Residence on Heat-map
 st.text("Distribution of Employees Residence on Heat-map")
-st.code('''
-employee_residence = df[df['employee_residence_grouped'] != 'Less than 5 employees per country']['employee_residence_grouped'].value_counts()
-employee_residence_filtered = pd.DataFrame({"residence": employee_residence.index.to_list(), 'number_of_programmers': employee_residence.values.tolist()})
-
-distribution_map = px.choropleth(
-    employee_residence_filtered,
-    locations="residence",
-    locationmode="ISO-3",
-    color="number_of_programmers",
-    hover_name="residence",
-    color_continuous_scale="Viridis",
-    title="Distribution of Programmers by Country",
-    width=1000,
-    height=800,
-    template='plotly_white'
-)
-''')
-
-employee_residence = df[df['employee_residence_grouped'] != 'Less than 5 employees per country']['employee_residence_grouped'].value_counts()
-employee_residence_filtered = pd.DataFrame({"residence": employee_residence.index.to_list(), 'number_of_programmers': employee_residence.values.tolist()})
+nb.cell('''
+employee_residence_filtered = agg['employee_residence_filtered']
 
 distribution_map = px.choropleth(
     employee_residence_filtered,
@@ -657,7 +461,8 @@ distribution_map = px.choropleth(
     template='plotly_white'
 )
 
-st.plotly_chart(distribution_map)
+distribution_map
+''')
 st.write("The most popular country for employees is the United States as I mention in Descriptive Statistics, but now we can see this result on the map.")
 
 # Hypothesis Statement
@@ -669,25 +474,25 @@ st.subheader("Hypothesis Check")
 st.write("We are interested in only remote employees, so I will take employees with `remote_ratio` = 100 and create a subdataframe:")
 
 # Fully Remote Employees
-st.code("fully_remote = df[df['remote_ratio'] == 100]")
-fully_remote = df[df['remote_ratio'] == 100]
+st.write("These subdataframes are the cohorts of the export below, selected by the same masks:")
+show_step(export._fully_remote)
+nb.cell("fully_remote = agg['fully_remote']")
 
 st.write('''
 Now, we create two dataframes:
 - With Seniors and Directors
 - With Juniors and Middles
 ''')
-st.code('''
-seniors_and_directors = fully_remote[((fully_remote['experience_level'] == 'Senior') | (fully_remote['experience_level'] == 'Director'))]
-juniors_and_middles = fully_remote[(fully_remote['experience_level'] == 'Junior') | (fully_remote['experience_level'] == 'Middle')]
-        ''')
-
-seniors_and_directors = fully_remote[((fully_remote['experience_level'] == 'Senior') | (fully_remote['experience_level'] == 'Director'))]
-juniors_and_middles = fully_remote[(fully_remote['experience_level'] == 'Junior') | (fully_remote['experience_level'] == 'Middle')]
+show_step(export._seniors_and_directors)
+show_step(export._juniors_and_middles)
+nb.cell('''
+seniors_and_directors = agg['seniors_and_directors']
+juniors_and_middles = agg['juniors_and_middles']
+''')
 
 # Salary Distribution among Seniors and Directors
 st.text("Let us check distribution of salaries among Seniors and Directors in companies with different sizes:")
-st.code('''
+nb.cell('''
 filter_seniors_and_directors_by_company = seniors_and_directors[seniors_and_directors['company_size'] != 'M']
 seniors_and_directors_plot = px.box(
     filter_seniors_and_directors_by_company,
@@ -708,38 +513,13 @@ seniors_and_directors_plot.update_layout(
     )
 )
 ''')
-
-
-filter_seniors_and_directors_by_company = seniors_and_directors[seniors_and_directors['company_size'] != 'M']
-seniors_and_directors_plot = px.box(
-    filter_seniors_and_directors_by_company,
-    x='experience_level',
-    y='salary_in_usd',
-    color='employment_type',
-    facet_col='company_size',
-    title='Salary Distribution by Experience Level and Company Size among Fully-Remote Seniors and Directors',
-    labels={'experience_level': 'Experience Level', 'salary_in_usd': 'Salary (USD)', 'employment_type': 'Employment Type'},
-    category_orders={"company_size": ["S", "L"]},
-    template='plotly_white'
-)
-
-seniors_and_directors_plot.update_layout(
-    xaxis=dict(
-        categoryorder='array',
-        categoryarray=['Senior', 'Director']
-    )
-)
-
-st.plotly_chart(seniors_and_directors_plot)
 st.write("Here we consider only remote workers. We can mention that salaries of such employees are bigger in large companies, but still it does not fully clear.")
 
 # Mean Salary Comparison: Seniors and Directors
 st.text("Let us plot mean value of salary among Seniors and Directors in Large companies and mean in Small companies together to have more detailed view:")
-st.code('''
-large_companies_dir_and_sen = seniors_and_directors[seniors_and_directors['company_size'] == 'L']
-small_and_medium_companies_dir_and_sen = seniors_and_directors[(seniors_and_directors['company_size'] == 'S')]
-
-companies_df_dir_and_sen = pd.DataFrame({'company_size': ['L', 'S'], 'mean_salary': [large_companies_dir_and_sen['salary_in_usd'].mean(), small_and_medium_companies_dir_and_sen['salary_in_usd'].mean()]})
+show_step(pipeline.company_size_comparison)
+nb.cell('''
+companies_df_dir_and_sen = agg['companies_df_dir_and_sen']
 
 salaries_comparison_seniors_and_directors = px.bar(
     companies_df_dir_and_sen,
@@ -755,32 +535,11 @@ salaries_comparison_seniors_and_directors.update_layout(
     width=700
 )
 ''')
-
-large_companies_dir_and_sen = seniors_and_directors[seniors_and_directors['company_size'] == 'L']
-small_and_medium_companies_dir_and_sen = seniors_and_directors[(seniors_and_directors['company_size'] == 'S')]
-
-companies_df_dir_and_sen = pd.DataFrame({'company_size': ['L', 'S'], 'mean_salary': [large_companies_dir_and_sen['salary_in_usd'].mean(), small_and_medium_companies_dir_and_sen['salary_in_usd'].mean()]})
-
-salaries_comparison_seniors_and_directors = px.bar(
-    companies_df_dir_and_sen,
-    x='company_size',
-    y='mean_salary',
-    title='Mean Salary Comparison: Seniors and Directors',
-    labels={'Mean Salary (USD)': 'Mean Salary (USD)', 'Company Type': 'Company Type'},
-    color='company_size',
-    template='plotly_white'
-)
-
-salaries_comparison_seniors_and_directors.update_layout(
-    width=700
-)
-
-st.plotly_chart(salaries_comparison_seniors_and_directors)
 st.write("Indeed, now we can easily see that salaries of Seniors and Directors in Large companies are bigger than salaries of similar employees but in small companies.")
 
 # Salary Distribution among Juniors and Middles
 st.text("Now let us check the same thing among Juniors and Middles:")
-st.code('''
+nb.cell('''
 filter_juniors_and_middles_by_company = juniors_and_middles[juniors_and_middles['company_size'] != 'M']
 juniors_and_middles_plot = px.box(
     filter_juniors_and_middles_by_company,
@@ -801,36 +560,11 @@ juniors_and_middles_plot.update_layout(
     )
 )
 ''')
-
-filter_juniors_and_middles_by_company = juniors_and_middles[juniors_and_middles['company_size'] != 'M']
-juniors_and_middles_plot = px.box(
-    filter_juniors_and_middles_by_company,
-    x='experience_level',
-    y='salary_in_usd',
-    color='employment_type',
-    facet_col='company_size',
-    title='Salary Distribution by Experience Level and Company Size among Fully-Remote Juniors and Middles',
-    labels={'experience_level': 'Experience Level', 'salary_in_usd': 'Salary (USD)', 'employment_type': 'Employment Type'},
-    category_orders={"company_size": ["S", "L"]},
-    template='plotly_white'
-)
-
-juniors_and_middles_plot.update_layout(
-    xaxis=dict(
-        categoryorder='array',
-        categoryarray=['Junior', 'Middle']
-    )
-)
-
-st.plotly_chart(juniors_and_middles_plot)
 st.write("Here, situation is a little bit more interesting, we cannot see that salary is really bigger in Large companies. So, let us go deeply to understand it:")
 
 # Mean Salary Comparison: Juniors and Middles
-st.code('''
-large_companies_mid_and_jun = juniors_and_middles[juniors_and_middles['company_size'] == 'L']
-small_and_medium_companies_mid_and_jun = juniors_and_middles[(juniors_and_middles['company_size'] == 'S')]
-
-companies_df_mid_and_jun = pd.DataFrame({'company_size': ['L', 'S'], 'mean_salary': [large_companies_mid_and_jun['salary_in_usd'].mean(), small_and_medium_companies_mid_and_jun['salary_in_usd'].mean()]})
+nb.cell('''
+companies_df_mid_and_jun = agg['companies_df_mid_and_jun']
 
 salaries_comparison_juniors_and_middles = px.bar(
     companies_df_mid_and_jun,
@@ -846,54 +580,66 @@ salaries_comparison_juniors_and_middles.update_layout(
     width=700
 )
 ''')
-
-large_companies_mid_and_jun = juniors_and_middles[juniors_and_middles['company_size'] == 'L']
-small_and_medium_companies_mid_and_jun = juniors_and_middles[(juniors_and_middles['company_size'] == 'S')]
-
-companies_df_mid_and_jun = pd.DataFrame({'company_size': ['L', 'S'], 'mean_salary': [large_companies_mid_and_jun['salary_in_usd'].mean(), small_and_medium_companies_mid_and_jun['salary_in_usd'].mean()]})
-
-salaries_comparison_juniors_and_middles = px.bar(
-    companies_df_mid_and_jun,
-    x='company_size',
-    y='mean_salary',
-    title='Mean Salary Comparison: Juniors and Middles',
-    labels={'Mean Salary (USD)': 'Mean Salary (USD)', 'Company Type': 'Company Type'},
-    color='company_size',
-    template='plotly_white'
-)
-
-salaries_comparison_juniors_and_middles.update_layout(
-    width=700
-)
-
-st.plotly_chart(salaries_comparison_juniors_and_middles)
 st.write("Now it can be seen that salaries of Juniors and Middles quite bigger in Large companies.")
 
 # Percentage Difference in Salaries
 st.text("Then let us calculate the difference between salaries in persentage for each of type of employees:")
-st.code('''
-def percentage(a, b):
-    if a > b:
-        return round(a / b * 100 - 100)
-    else:
-        return round(b / a * 100 - 100)
-
-change_sen_dir = percentage(large_companies_dir_and_sen['salary_in_usd'].mean(), small_and_medium_companies_dir_and_sen['salary_in_usd'].mean())
-change_jun_mid = percentage(large_companies_mid_and_jun['salary_in_usd'].mean(), small_and_medium_companies_mid_and_jun['salary_in_usd'].mean())
+show_step(pipeline.percentage)
+nb.cell('''
+change_sen_dir = agg['change_sen_dir']
+change_jun_mid = agg['change_jun_mid']
 ''')
 
-def percentage(a, b):
-    if a > b:
-        return round(a / b * 100 - 100)
-    else:
-        return round(b / a * 100 - 100)
-
-change_sen_dir = percentage(large_companies_dir_and_sen['salary_in_usd'].mean(), small_and_medium_companies_dir_and_sen['salary_in_usd'].mean())
-change_jun_mid = percentage(large_companies_mid_and_jun['salary_in_usd'].mean(), small_and_medium_companies_mid_and_jun['salary_in_usd'].mean())
-
-st.write(f'The difference in the percentage of salaries between Seniors and Directors in Large and Small companies is: {change_sen_dir} %')
-st.write(f'The difference in the percentage of salaries between Juniors and Middles in Large and Small companies is: {change_jun_mid} %')
+st.write(f'The difference in the percentage of salaries between Seniors and Directors in Large and Small companies is: {nb["change_sen_dir"]} %')
+st.write(f'The difference in the percentage of salaries between Juniors and Middles in Large and Small companies is: {nb["change_jun_mid"]} %')
+
+# Export
+st.subheader("Export")
+export_cohort = nb.inputs['export_cohort'] = st.selectbox('Cohort', list(COHORTS), index=list(COHORTS).index('fully_remote'))
+export_format = nb.inputs['export_format'] = st.radio('Format', list(FORMATS), horizontal=True)
+# A link to the API only works if this process serves it, or DS_API_URL says where it is
+# served. Otherwise another process may own the port, so the app builds the file itself.
+if api_server is not None or api.PUBLIC_URL:
+    st.write("Any of the subdataframes built above can be downloaded. The API streams the rows in chunks straight from the prepared dataset, without building the whole file first.")
+    nb.cell('''
+download_url = export_url(export_cohort, export_format, exclude_outliers)
+''', cache=False)
+    st.link_button('Download', nb['download_url'])
+else:
+    st.write("Any of the subdataframes built above can be downloaded. The rows are written in chunks straight from the prepared dataset, without copying the whole cohort first:")
+    nb.cell('''
+export_data = lambda: b''.join(iter_export(df, export_cohort, export_format))
+''', cache=False)
+    st.download_button(
+        'Download',
+        data=nb['export_data'],
+        file_name=f'{export_cohort}.{export_format}',
+        mime=FORMATS[export_format][1],
+        on_click='ignore',
+    )
 
 # Discussion
 st.subheader("Discussion")
-st.write("In conclusion, my hypothesis was proved and the it was right. Salaries for Seniors and Directors in large companies are significantly higher than those in small companies, with a 47% difference. Similarly, Juniors and Middles in large companies earn 68% more on average compared to employees in the same positions at small companies.")
+st.write(f"In conclusion, my hypothesis was proved and the it was right. Salaries for Seniors and Directors in large companies are significantly higher than those in small companies, with a {nb['change_sen_dir']}% difference. Similarly, Juniors and Middles in large companies earn {nb['change_jun_mid']}% more on average compared to employees in the same positions at small companies.")
+
+# Salary Estimate
+st.subheader("Salary Estimate")
+st.write("Finally, let us estimate a salary for a given profile. The model is a ridge regression on the logarithm of `salary_in_usd` over the categorical columns used above:")
+
+raw_df = pipeline.raw_frame(SOURCE)
+nb.inputs['salary_estimator'] = load_salary_estimator(SOURCE.fingerprint)
+nb.inputs['candidate'] = pd.DataFrame([{
+    'work_year': st.selectbox('Year', sorted(raw_df['work_year'].unique()), index=raw_df['work_year'].nunique() - 1),
+    'experience_level': st.selectbox('Experience Level', list(EXPERIENCE_LEVEL_MAPPING), format_func=EXPERIENCE_LEVEL_MAPPING.get),
+    'employment_type': st.selectbox('Employment Type', list(EMPLOYMENT_TYPE_MAPPING), format_func=EMPLOYMENT_TYPE_MAPPING.get, index=1),
+    'job_title': st.selectbox('Job Title', sorted(raw_df['job_title'].unique())),
+    'employee_residence': st.selectbox('Residence', sorted(raw_df['employee_residence'].unique())),
+    'company_size': st.selectbox('Company Size', ['S', 'M', 'L']),
+    'remote_ratio': st.selectbox('Remote Ratio', [0, 50, 100]),
+}], columns=FEATURES)
+
+# Scoring is cheap and every profile differs, so the result is not cached
+nb.cell('''
+estimate = salary_estimator.score(candidate)[0]
+''', cache=False)
+st.write(f'Estimated salary: **${nb["estimate"]:,.0f}**')
@@ -0,0 +1,239 @@
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+from importlib import metadata
+
+from dataset import CACHE_DIR, CACHE_MODE, UNREADABLE_PICKLE_ERRORS, write_atomic
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+STAGE_CACHE_DIR = os.path.join(CACHE_DIR, 'stages')
+MAX_CACHE_BYTES = 1 << 30
+MAX_MEMORY_ENTRIES = 64
+FINGERPRINT_CHUNK_SIZE = 1 << 20
+
+# Cached results are pickles of these libraries' objects and are only valid for the versions that built them
+LIBRARY_VERSIONS = tuple((name, metadata.version(name)) for name in ('pandas', 'numpy', 'plotly'))
+
+
+def _hash(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(repr(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def code_version(fn) -> str:
+    """Hashes the bytecode and constants of ``fn``, including nested functions and lambdas."""
+    def walk(code):
+        yield code.co_code
+        yield code.co_names
+        for const in code.co_consts:
+            if inspect.iscode(const):
+                yield from walk(const)
+            elif isinstance(const, frozenset):
+                # Set iteration order depends on the per-process string hash seed
+                yield sorted(map(repr, const))
+            else:
+                yield const
+
+    return _hash(*walk(fn.__code__))
+
+
+def project_module(obj):
+    """The module of this project that ``obj`` is (or was defined in), None for anything else."""
+    module = obj if inspect.ismodule(obj) else inspect.getmodule(obj)
+    path = getattr(module, '__file__', None)
+    if path and os.path.dirname(os.path.abspath(path)) == PROJECT_DIR:
+        return module
+    return None
+
+
+_sources = {}
+
+
+def _read_source(path: str) -> bytes:
+    stat = os.stat(path)
+    stat_key = (path, stat.st_size, stat.st_mtime_ns)
+    if stat_key not in _sources:
+        with open(path, 'rb') as f:
+            _sources[stat_key] = f.read()
+    return _sources[stat_key]
+
+
+def module_version(module) -> str:
+    """Hashes the source of ``module`` and of the project modules it uses, recursively.
+
+    Unlike ``code_version`` this covers module-level settings and helpers a function reads
+    as globals, such as thresholds. Call it from a module with ``module_version(__name__)``.
+    """
+    if isinstance(module, str):
+        module = sys.modules[module]
+    sources = {}
+    pending = [module]
+    while pending:
+        module = pending.pop()
+        if module.__name__ in sources:
+            continue
+        sources[module.__name__] = _read_source(module.__file__)
+        for value in list(vars(module).values()):
+            dependency = project_module(value)
+            if dependency is not None and dependency.__name__ not in sources:
+                pending.append(dependency)
+    return _hash(*sorted(sources.items()))
+
+
+class Source:
+    """An input file identified by a fingerprint of its bytes.
+
+    The digest is memoized per ``(size, mtime, inode)`` so unchanged files are not rehashed
+    on every rerun, while any edit produces a new fingerprint.
+    """
+
+    _fingerprints = {}
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @property
+    def fingerprint(self) -> str:
+        stat = os.stat(self.path)
+        stat_key = (os.path.abspath(self.path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        if stat_key not in Source._fingerprints:
+            h = hashlib.sha256()
+            with open(self.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(FINGERPRINT_CHUNK_SIZE), b''):
+                    h.update(chunk)
+            Source._fingerprints[stat_key] = h.hexdigest()
+        return Source._fingerprints[stat_key]
+
+
+class DiskStore:
+    """Pickled values on disk, evicted least-recently-used first once ``max_bytes`` is exceeded."""
+
+    def __init__(self, root: str = STAGE_CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key + '.pkl')
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except UNREADABLE_PICKLE_ERRORS:
+            # Missing, truncated or written by other library versions, and replaced on the next put
+            raise KeyError(key)
+        # Touching the file records the access for LRU eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def put(self, key: str, value):
+        # Pickle first, so an unpicklable value raises before anything is written
+        write_atomic(self._path(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.root):
+                if entry.name.endswith('.pkl'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+class Stage:
+    """A pipeline step cached under a key derived from its inputs and its code.
+
+    The key combines the stage name, its code version, the versions of the libraries whose
+    objects it pickles, the keyword parameters the stage function accepts and the keys of its upstream stages (or the source fingerprint for
+    stages without upstreams). Editing the data or any stage's code therefore changes
+    the keys of every stage downstream of it, so stale results are never looked up.
+    The bytecode does not cover helpers and settings the stage reads as globals, so pass
+    ``version=module_version(__name__)`` (or bump ``version``) for stages that use them.
+    """
+
+    def __init__(self, fn, version: int | str = 1, upstream: tuple = (), store: DiskStore = None):
+        self.fn = fn
+        self.name = fn.__qualname__
+        self.version = version
+        self.upstream = tuple(upstream)
+        self.store = store or default_store
+        self.params = [
+            name for name, param in inspect.signature(fn).parameters.items()
+            if param.kind == param.KEYWORD_ONLY
+        ]
+        self.code_version = code_version(fn)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _own_params(self, params: dict) -> dict:
+        return {name: params[name] for name in self.params if name in params}
+
+    def key(self, source: Source, **params) -> str:
+        if self.upstream:
+            inputs = [stage.key(source, **params) for stage in self.upstream]
+        else:
+            inputs = [source.fingerprint]
+        return _hash(self.name, self.version, self.code_version, LIBRARY_VERSIONS, inputs, sorted(self._own_params(params).items()))
+
+    def _compute(self, source: Source, **params):
+        if self.upstream:
+            args = [stage(source, **params) for stage in self.upstream]
+        else:
+            args = [source]
+        return self.fn(*args, **self._own_params(params))
+
+    def __call__(self, source: Source, **params):
+        if CACHE_MODE == 'off':
+            return self._compute(source, **params)
+
+        key = self.key(source, **params)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        if CACHE_MODE == 'disk':
+            try:
+                value = self.store.get(key)
+            except KeyError:
+                value = self._compute(source, **params)
+                self.store.put(key, value)
+        else:
+            value = self._compute(source, **params)
+
+        with self._lock:
+            self._memory[key] = value
+            while len(self._memory) > MAX_MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+        return value
+
+
+def stage(version: int | str = 1, upstream: tuple = ()):
+    def decorator(fn) -> Stage:
+        return Stage(fn, version=version, upstream=upstream)
+    return decorator
+
+
+default_store = DiskStore()
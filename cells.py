@@ -0,0 +1,345 @@
+import ast
+import copy
+import datetime
+import hashlib
+import importlib
+import inspect
+import os
+import pickle
+import textwrap
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from cache import CACHE_MODE, LIBRARY_VERSIONS, DiskStore, Source, Stage, _hash, code_version, module_version, project_module
+from dataset import CACHE_DIR
+
+CELL_CACHE_DIR = os.path.join(CACHE_DIR, 'cells')
+MAX_MEMORY_ENTRIES = 256
+
+# Method calls that change the object they are called on, besides those passed inplace=True
+MUTATING_METHOD_PREFIXES = ('update', 'add_', 'append', 'extend', 'insert', 'pop')
+
+
+def _base_name(node):
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _bound_names(node) -> set:
+    """Names bound inside a function, lambda or comprehension, including its parameters."""
+    names = set()
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+        args = node.args
+        names.update(arg.arg for arg in args.posonlyargs + args.args + args.kwonlyargs)
+        names.update(arg.arg for arg in (args.vararg, args.kwarg) if arg)
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Store):
+            names.add(child.id)
+    return names
+
+
+def _loads(node, bound: frozenset = frozenset()) -> set:
+    """Names ``node`` reads from its enclosing scope."""
+    if isinstance(node, ast.Name):
+        return {node.id} if isinstance(node.ctx, ast.Load) and node.id not in bound else set()
+    if isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name) and node.target.id not in bound:
+        # ``x += 1`` reads x before binding it again
+        return {node.target.id} | _loads(node.value, bound)
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+        bound = bound | _bound_names(node)
+    names = set()
+    for child in ast.iter_child_nodes(node):
+        names |= _loads(child, bound)
+    return names
+
+
+def _writes(statement) -> tuple:
+    """Names a top-level statement binds, and names it mutates in place."""
+    binds, mutates = set(), set()
+    if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        binds.add(statement.name)
+        return binds, mutates
+    if isinstance(statement, (ast.Import, ast.ImportFrom)):
+        binds.update((alias.asname or alias.name).split('.')[0] for alias in statement.names)
+        return binds, mutates
+
+    nodes = [statement]
+    while nodes:
+        node = nodes.pop()
+        # Names bound inside lambdas and comprehensions stay local to them
+        if isinstance(node, (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+            continue
+        nodes.extend(ast.iter_child_nodes(node))
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            binds.add(node.id)
+        elif isinstance(node, (ast.Subscript, ast.Attribute)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            mutates.add(_base_name(node))
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            inplace = any(
+                keyword.arg == 'inplace' and isinstance(keyword.value, ast.Constant) and keyword.value.value is True
+                for keyword in node.keywords
+            )
+            if inplace or node.func.attr.startswith(MUTATING_METHOD_PREFIXES):
+                mutates.add(_base_name(node.func.value))
+    mutates.discard(None)
+    return binds, mutates
+
+
+def _imports(statement) -> set:
+    """Absolute module names a top-level import statement loads."""
+    if isinstance(statement, ast.Import):
+        return {alias.name for alias in statement.names}
+    if isinstance(statement, ast.ImportFrom) and statement.level == 0:
+        return {statement.module}
+    return set()
+
+
+def _isolate(value):
+    """A copy of ``value`` a cell can change without altering the cached original."""
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        # A deep copy, since a shallow one shares its data unless copy-on-write is enabled
+        return value.copy()
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if type(value) is dict:
+        return {key: _isolate(item) for key, item in value.items()}
+    if type(value) in (list, tuple, set):
+        return type(value)(_isolate(item) for item in value)
+    if isinstance(value, (str, bytes, int, float, complex, bool, type(None), Source)) or callable(value) or inspect.ismodule(value):
+        return value
+    try:
+        return copy.deepcopy(value)
+    except (TypeError, copy.Error, pickle.PicklingError):
+        # Threads, locks and the like cannot be copied, and cells only use them
+        return value
+
+
+def _content_token(value):
+    """A token of the content of ``value``, or None when its content cannot be hashed.
+
+    Frames and arrays are hashed in full, since their repr leaves out all but a few rows.
+    """
+    if isinstance(value, (str, bytes, int, float, complex, bool, type(None), np.generic, datetime.date, datetime.time, datetime.timedelta)):
+        return repr(value)
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        try:
+            hashes = pd.util.hash_pandas_object(value, index=True)
+        except TypeError:
+            # Lists and other unhashable objects in the values
+            return None
+        if isinstance(value, pd.DataFrame):
+            layout = (value.columns.tolist(), value.dtypes.astype(str).tolist(), list(value.index.names))
+        elif isinstance(value, pd.Series):
+            layout = (value.name, str(value.dtype), list(value.index.names))
+        else:
+            layout = (list(value.names), str(value.dtype))
+        return type(value).__name__, layout, hashlib.sha256(hashes.to_numpy().tobytes()).hexdigest()
+    if isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            # The bytes of an object array are pointers, so hash the objects instead
+            items = _content_token(value.tolist())
+            return None if items is None else ('ndarray', value.shape, items)
+        return 'ndarray', str(value.dtype), value.shape, hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+    if type(value) in (list, tuple, set, frozenset, dict):
+        items = value.items() if type(value) is dict else value
+        tokens = [_content_token(item) for item in items]
+        if any(token is None for token in tokens):
+            return None
+        if type(value) in (set, frozenset, dict):
+            tokens.sort(key=repr)
+        return type(value).__name__, tokens
+    return None
+
+
+def _project_version(value):
+    """Identifies a module, function, class or stage of this project by its name and the
+    version of its module, or returns None for anything else."""
+    if isinstance(value, Stage):
+        name, value = value.name, value.fn
+    elif inspect.ismodule(value):
+        name = value.__name__
+    elif inspect.isfunction(value) or inspect.isclass(value):
+        name = value.__qualname__
+    else:
+        return None
+    module = project_module(value)
+    return (name, module_version(module)) if module is not None else None
+
+
+class Cell:
+    """A piece of notebook code that is both displayed and executed.
+
+    ``reads`` are the names the code takes from cells above it (or from the notebook
+    inputs) and ``writes`` the names it binds or changes in place. A name the cell
+    assigns before using it is local to the cell and not a read. If the last statement
+    is an expression, its value is what the cell displays. The cell runs on copies of
+    what it reads, so changing them in place never alters the values of other cells.
+    """
+
+    def __init__(self, source: str, files: tuple = ()):
+        self.source = textwrap.dedent(source).strip('\n')
+        self.files = tuple(files)
+        tree = ast.parse(self.source)
+
+        self.reads, self.writes, self.imports = set(), set(), set()
+        for statement in tree.body:
+            binds, mutates = _writes(statement)
+            # Mutating a name also reads it, even if the cell is the one that bound it first
+            self.reads |= (_loads(statement) | mutates) - self.writes
+            self.writes |= binds | mutates
+            self.imports |= _imports(statement)
+
+        body = tree.body
+        self.display = None
+        if body and isinstance(body[-1], ast.Expr):
+            self.display = compile(ast.Expression(body[-1].value), '<cell>', 'eval')
+            body = body[:-1]
+        self.code = compile(ast.Module(body=body, type_ignores=[]), '<cell>', 'exec')
+
+        self.key = None
+        self.value = None
+
+    def run(self, namespace: dict) -> dict:
+        namespace = {name: _isolate(value) for name, value in namespace.items()}
+        exec(self.code, namespace)
+        value = eval(self.display, namespace) if self.display else None
+        return {
+            'outputs': {name: namespace[name] for name in self.writes if name in namespace},
+            'value': value,
+        }
+
+
+class Notebook:
+    """Runs cells top to bottom, recomputing only the cells whose inputs changed.
+
+    Each read of a cell is resolved to the latest cell above it that writes the name,
+    or to a notebook input, which yields the dependency graph of the notebook. A cell's
+    cache key combines its source, the keys of the cells it depends on, the inputs and
+    files it uses and the code of the functions it calls, so when a widget value or the
+    data changes, only the cells downstream of it miss the cache and run again. Modules,
+    functions and stages of this project count with the source of their whole module
+    (see ``cache.module_version``), so editing a setting or helper they use is a change too.
+    """
+
+    _memory = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, inputs: dict = None, store: DiskStore = None):
+        self.inputs = dict(inputs or {})
+        self.store = store or DiskStore(CELL_CACHE_DIR)
+        self.cells = []
+        self.values = {}
+        self.producers = {}
+
+    def __getitem__(self, name: str):
+        return self.values[name]
+
+    def _token(self, name: str, value):
+        if isinstance(value, Source):
+            return value.fingerprint
+        version = _project_version(value)
+        if version is not None:
+            return version
+        if name in self.producers:
+            token = self.producers[name].key
+        elif inspect.ismodule(value):
+            token = value.__name__
+        elif callable(value):
+            token = repr(value)
+        else:
+            token = _content_token(value)
+            if token is None:
+                return None
+        if inspect.isfunction(value):
+            return token, code_version(value)
+        return token
+
+    def _resolve(self, cell: Cell) -> dict:
+        namespace = {}
+        for name in sorted(cell.reads):
+            if name in self.values:
+                namespace[name] = self.values[name]
+            elif name in self.inputs:
+                namespace[name] = self.inputs[name]
+        return namespace
+
+    def _lookup(self, key: str):
+        with Notebook._lock:
+            if key in Notebook._memory:
+                Notebook._memory.move_to_end(key)
+                return Notebook._memory[key]
+        if CACHE_MODE == 'disk':
+            result = self.store.get(key)
+            self._remember(key, result)
+            return result
+        raise KeyError(key)
+
+    def _remember(self, key: str, result: dict):
+        with Notebook._lock:
+            Notebook._memory[key] = result
+            while len(Notebook._memory) > MAX_MEMORY_ENTRIES:
+                Notebook._memory.popitem(last=False)
+
+    def run(self, cell: Cell, cache: bool = True) -> Cell:
+        """Runs ``cell`` or takes its cached result.
+
+        Cells that only call stages pass ``cache=False``, since the stages keep their results.
+        """
+        namespace = self._resolve(cell)
+        tokens = sorted((name, self._token(name, value)) for name, value in namespace.items())
+        if any(token is None for _, token in tokens):
+            # An input whose content cannot be hashed: the cell always runs, and a fresh key
+            # makes the cells reading its outputs run again as well
+            cache = False
+            tokens.append(('', uuid.uuid4().hex))
+        cell.key = _hash(
+            'cell',
+            cell.source,
+            LIBRARY_VERSIONS,
+            tokens,
+            [Source(path).fingerprint for path in cell.files],
+            sorted((name, _project_version(importlib.import_module(name))) for name in cell.imports),
+        )
+        cache = cache and CACHE_MODE != 'off'
+
+        result = None
+        if cache:
+            try:
+                result = self._lookup(cell.key)
+            except KeyError:
+                pass
+
+        if result is None:
+            result = cell.run(namespace)
+            if cache:
+                self._remember(cell.key, result)
+            if cache and CACHE_MODE == 'disk':
+                try:
+                    self.store.put(cell.key, result)
+                except (pickle.PicklingError, TypeError, AttributeError):
+                    # Functions and modules defined by a cell only live in memory
+                    pass
+
+        cell.value = result['value']
+        self.values.update(result['outputs'])
+        for name in result['outputs']:
+            self.producers[name] = cell
+        self.cells.append(cell)
+        return cell
+
+    def cell(self, source: str, files: tuple = (), cache: bool = True) -> Cell:
+        """Displays ``source``, runs it (or takes its cached result) and displays its value."""
+        cell = self.run(Cell(source, files), cache=cache)
+        st.code(cell.source)
+        if cell.value is not None:
+            if hasattr(cell.value, 'to_plotly_json'):
+                st.plotly_chart(cell.value)
+            else:
+                st.write(cell.value)
+        return cell
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+
+CACHE_DIR = os.environ.get('DS_CACHE_DIR', '.cache')
+
+# 'disk' persists caches and sidecars, 'memory' keeps them per process only, 'off' recomputes every call
+CACHE_MODES = ('disk', 'memory', 'off')
+CACHE_MODE = os.environ.get('DS_CACHE_MODE', 'disk')
+if CACHE_MODE not in CACHE_MODES:
+    raise ValueError(f'DS_CACHE_MODE must be one of {CACHE_MODES}, got {CACHE_MODE!r}')
+
+# What loading a truncated file, or one pickled by other library versions, can raise
+# (e.g. ModuleNotFoundError for a pandas class that has moved since)
+UNREADABLE_PICKLE_ERRORS = (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError, TypeError, ValueError)
+
+# Pickled cache files of the 'memory' mode by path, so callers get their own copy as from disk
+_memory = {}
+_memory_lock = threading.Lock()
+
+
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_source(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def is_append_of(data: bytes, source_digest: str, source_bytes: int) -> bool:
+    # True when ``data`` starts with exactly the bytes a sidecar was built from
+    return len(data) >= source_bytes and digest(data[:source_bytes]) == source_digest
+
+
+def load_pickle(path: str):
+    """Loads a cache file, or returns None when it is missing or unreadable."""
+    if CACHE_MODE == 'off':
+        return None
+    if CACHE_MODE == 'memory':
+        with _memory_lock:
+            data = _memory.get(path)
+        return pickle.loads(data) if data is not None else None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except UNREADABLE_PICKLE_ERRORS:
+        # A truncated or stale file is a cache miss, the next save replaces it
+        return None
+
+
+def save_pickle(path: str, value):
+    if CACHE_MODE == 'off':
+        return
+    if CACHE_MODE == 'memory':
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with _memory_lock:
+            _memory[path] = data
+        return
+
+    # Pickle first, so an unpicklable value raises before anything is written
+    write_atomic(path, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def write_atomic(path: str, data: bytes):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    # Concurrent writers each get their own temp file, and the last rename wins
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def load_sidecar(cache_path: str):
+    cached = load_pickle(cache_path)
+    return cached if isinstance(cached, dict) and 'source_digest' in cached else None
+
+
+def save_sidecar(cache_path: str, data: bytes, **payload):
+    save_pickle(cache_path, {'source_digest': digest(data), 'source_bytes': len(data), **payload})
@@ -0,0 +1,130 @@
+"""Streams the rows of a cohort to CSV or Parquet in chunks.
+
+    python export.py seniors_and_directors --format parquet --output seniors_and_directors.parquet
+"""
+import argparse
+import io
+import sys
+
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 50_000
+
+
+def _fully_remote(df: pd.DataFrame) -> pd.Series:
+    return df['remote_ratio'] == 100
+
+
+def _seniors_and_directors(df: pd.DataFrame) -> pd.Series:
+    return _fully_remote(df) & df['experience_level'].isin(['Senior', 'Director'])
+
+
+def _juniors_and_middles(df: pd.DataFrame) -> pd.Series:
+    return _fully_remote(df) & df['experience_level'].isin(['Junior', 'Middle'])
+
+
+# Same subsets as the hypothesis check in app.py, as boolean masks over the analysis frame
+COHORTS = {
+    'all': lambda df: pd.Series(True, index=df.index),
+    'fully_remote': _fully_remote,
+    'seniors_and_directors': _seniors_and_directors,
+    'juniors_and_middles': _juniors_and_middles,
+    'large_companies_dir_and_sen': lambda df: _seniors_and_directors(df) & (df['company_size'] == 'L'),
+    'small_and_medium_companies_dir_and_sen': lambda df: _seniors_and_directors(df) & (df['company_size'] == 'S'),
+    'large_companies_mid_and_jun': lambda df: _juniors_and_middles(df) & (df['company_size'] == 'L'),
+    'small_and_medium_companies_mid_and_jun': lambda df: _juniors_and_middles(df) & (df['company_size'] == 'S'),
+}
+
+
+def cohort_mask(df: pd.DataFrame, cohort: str) -> np.ndarray:
+    return COHORTS[cohort](df).to_numpy(dtype=bool)
+
+
+def iter_chunks(df: pd.DataFrame, mask: np.ndarray, chunk_size: int = CHUNK_SIZE):
+    # Only one chunk of matching rows is copied at a time
+    for start in range(0, len(df), chunk_size):
+        chunk_mask = mask[start:start + chunk_size]
+        if chunk_mask.any():
+            yield df.iloc[start:start + chunk_size][chunk_mask]
+
+
+def iter_csv(df: pd.DataFrame, mask: np.ndarray, chunk_size: int = CHUNK_SIZE):
+    yield df.iloc[:0].to_csv(index=False).encode()
+    for chunk in iter_chunks(df, mask, chunk_size):
+        yield chunk.to_csv(index=False, header=False).encode()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last ``drain``."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def iter_parquet(df: pd.DataFrame, mask: np.ndarray, chunk_size: int = CHUNK_SIZE):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Infer the schema from a real row, empty object columns would come out as null
+    schema = pa.Schema.from_pandas(df.iloc[:1], preserve_index=False)
+    sink = _Sink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in iter_chunks(df, mask, chunk_size):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'parquet': (iter_parquet, 'application/vnd.apache.parquet'),
+}
+
+
+def iter_export(df: pd.DataFrame, cohort: str, fmt: str = 'csv', chunk_size: int = CHUNK_SIZE):
+    iter_format, _ = FORMATS[fmt]
+    return iter_format(df, cohort_mask(df, cohort), chunk_size)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('cohort', choices=list(COHORTS))
+    parser.add_argument('--format', default='csv', choices=list(FORMATS))
+    parser.add_argument('--output', help='file to write, standard output by default')
+    parser.add_argument('--exclude-outliers', action='store_true')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    import pipeline
+    df = pipeline.analysis_frame(pipeline.SOURCE, exclude_outliers=args.exclude_outliers)
+
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for data in iter_export(df, args.cohort, args.format, args.chunk_size):
+            out.write(data)
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
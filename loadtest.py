@@ -0,0 +1,206 @@
+"""Drives concurrent simulated sessions of app.py and reports rerun latency under load.
+
+Each configuration and session count runs in a fresh worker process, so memory numbers
+are per process and caches start from the state the configuration prescribes:
+
+    python loadtest.py --sessions 1 4 16 --configs disk memory off cold
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from pipeline import EXPERIENCE_LEVEL_MAPPING
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+CONFIGS = {
+    'disk': {'DS_CACHE_MODE': 'disk'},
+    'memory': {'DS_CACHE_MODE': 'memory'},
+    'off': {'DS_CACHE_MODE': 'off'},
+    # Persistent cache, but every worker starts from an empty cache directory
+    'cold': {'DS_CACHE_MODE': 'disk', 'DS_CACHE_DIR': None},
+}
+
+
+def _open(at, rng):
+    return at.run()
+
+
+def _toggle_outliers(at, rng):
+    checkbox = at.sidebar.checkbox[0]
+    return checkbox.set_value(not checkbox.value).run()
+
+
+def _pick(label: str, values: list = None):
+    # AppTest selects by displayed option, so widgets with a format_func need their raw values
+    def step(at, rng):
+        selectbox = next(widget for widget in at.selectbox if widget.label == label)
+        if values is not None:
+            return selectbox.select(rng.choice(values)).run()
+        return selectbox.select_index(rng.randrange(len(selectbox.options))).run()
+    step.__name__ = f'pick {label!r}'
+    return step
+
+
+SCRIPTS = {
+    'browse': [_open, _toggle_outliers, _toggle_outliers],
+    'estimate': [_open, _pick('Job Title'), _pick('Residence'), _pick('Experience Level', list(EXPERIENCE_LEVEL_MAPPING))],
+    'mixed': [_open, _toggle_outliers, _pick('Job Title'), _toggle_outliers, _pick('Company Size')],
+}
+
+
+def _rss_mb() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return float('nan')
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def run_sessions(n_sessions: int, script: str, iterations: int, seed: int, timeout: float) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    latencies = []
+    errors = []
+    driver_errors = []
+    start = threading.Barrier(n_sessions)
+
+    def session(index: int):
+        rng = random.Random(seed + index)
+        start.wait()
+        for _ in range(iterations):
+            at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+            for step in SCRIPTS[script]:
+                t0 = time.perf_counter()
+                try:
+                    at = step(at, rng)
+                except Exception as exc:
+                    # AppTest occasionally trips over widget state shared between threads;
+                    # record it and restart the script in a fresh session
+                    driver_errors.append(f'{step.__name__}: {exc!r}')
+                    break
+                latencies.append(time.perf_counter() - t0)
+                errors.extend(str(e.value) for e in at.exception)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(n_sessions)]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+
+    latencies_ms = np.array(latencies) * 1000
+    # Every step can fail, which leaves no latencies to summarize
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]) if len(latencies_ms) else [float('nan')] * 3
+    return {
+        'sessions': n_sessions,
+        'reruns': len(latencies),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'throughput': len(latencies) / wall,
+        'rss_mb': _rss_mb(),
+        'peak_rss_mb': _peak_rss_mb(),
+        'errors': len(errors),
+        'driver_errors': len(driver_errors),
+        # Distinct messages with how often they occurred, most frequent first
+        'error_messages': Counter(errors).most_common(),
+        'driver_error_messages': Counter(driver_errors).most_common(),
+    }
+
+
+def _worker(args) -> int:
+    if args.warmup:
+        run_sessions(1, args.script, 1, args.seed, args.timeout)
+    result = run_sessions(args.sessions[0], args.script, args.iterations, args.seed, args.timeout)
+    print(json.dumps(result))
+    return 0
+
+
+def _spawn(config: str, n_sessions: int, args) -> dict:
+    command = [
+        sys.executable, os.path.abspath(__file__), '--worker',
+        '--sessions', str(n_sessions),
+        '--script', args.script,
+        '--iterations', str(args.iterations),
+        '--seed', str(args.seed),
+        '--timeout', str(args.timeout),
+    ]
+    if args.warmup:
+        command.append('--warmup')
+
+    # A cold cache directory holds up to a full stage and cell store, so it goes with the worker
+    with tempfile.TemporaryDirectory(prefix='ds_cache_') as cold_cache_dir:
+        env = dict(os.environ)
+        for name, value in CONFIGS[config].items():
+            env[name] = value if value is not None else cold_cache_dir
+
+        # The app reads its data and cache paths relative to its own directory
+        completed = subprocess.run(command, env=env, cwd=os.path.dirname(APP_PATH), capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f'{config} worker with {n_sessions} sessions failed:\n{completed.stderr}')
+    return {'config': config, **json.loads(completed.stdout.strip().splitlines()[-1])}
+
+
+def _print_table(results: list):
+    columns = ['config', 'sessions', 'reruns', 'p50_ms', 'p95_ms', 'p99_ms', 'throughput', 'rss_mb', 'peak_rss_mb', 'errors', 'driver_errors']
+    rows = [[f'{row[col]:.1f}' if isinstance(row[col], float) else str(row[col]) for col in columns] for row in results]
+    widths = [max(len(col), *(len(row[i]) for row in rows)) for i, col in enumerate(columns)]
+    print('  '.join(col.rjust(width) for col, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(value.rjust(width) for value, width in zip(row, widths)))
+
+    for row in results:
+        for kind in ['error_messages', 'driver_error_messages']:
+            for message, count in row[kind]:
+                print(f'{row["config"]}, {row["sessions"]} sessions, {kind.replace("_messages", "")} x{count}: {message}')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8], help='concurrent session counts to measure')
+    parser.add_argument('--configs', nargs='+', default=['disk'], choices=sorted(CONFIGS), help='configurations to compare')
+    parser.add_argument('--script', default='mixed', choices=sorted(SCRIPTS), help='interaction script every session replays')
+    parser.add_argument('--iterations', type=int, default=3, help='times each session replays the script')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120.0, help='seconds allowed for a single rerun')
+    parser.add_argument('--warmup', action='store_true', help='run the script once in a single session before measuring')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return _worker(args)
+
+    results = []
+    for config in args.configs:
+        for n_sessions in args.sessions:
+            results.append(_spawn(config, n_sessions, args))
+            print(f'{config}: {n_sessions} sessions, p50 {results[-1]["p50_ms"]:.1f} ms', file=sys.stderr)
+    _print_table(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
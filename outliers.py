@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import module_version
+from dataset import CACHE_DIR, digest, is_append_of, load_sidecar, read_source, save_sidecar
+
+COHORT = ['experience_level', 'company_size', 'remote_ratio']
+FLAG_COLUMNS = ['iqr_outlier', 'mad_outlier', 'is_outlier']
+
+IQR_FACTOR = 1.5
+MAD_THRESHOLD = 3.5
+FLAGS_CACHE_PATH = os.path.join(CACHE_DIR, 'outlier_flags.pkl')
+# Flags cached by an older version of the thresholds or of the code below are recomputed
+FLAGS_VERSION = module_version(__name__)
+
+
+def flag_outliers(df: pd.DataFrame, value: str = 'salary_in_usd', by: list = COHORT) -> pd.DataFrame:
+    """Flags rows outside the IQR fences or above the modified z-score threshold of their cohort."""
+    values = df[value].astype(float)
+    groups = values.groupby([df[col] for col in by], sort=False)
+
+    q1 = groups.transform('quantile', 0.25)
+    q3 = groups.transform('quantile', 0.75)
+    iqr = q3 - q1
+    iqr_outlier = (values < q1 - IQR_FACTOR * iqr) | (values > q3 + IQR_FACTOR * iqr)
+
+    median = groups.transform('median')
+    deviation = (values - median).abs()
+    mad = deviation.groupby([df[col] for col in by], sort=False).transform('median')
+    # 0.6745 scales the MAD to the standard deviation of a normal distribution
+    modified_z = 0.6745 * deviation / mad.replace(0, np.nan)
+    mad_outlier = modified_z > MAD_THRESHOLD
+
+    return pd.DataFrame({
+        'iqr_outlier': iqr_outlier,
+        'mad_outlier': mad_outlier,
+        'is_outlier': iqr_outlier | mad_outlier,
+    }, index=df.index)
+
+
+def update_outlier_flags(flags: pd.DataFrame, df: pd.DataFrame, value: str = 'salary_in_usd', by: list = COHORT) -> pd.DataFrame:
+    """Extends ``flags`` computed for the first rows of ``df`` to the rows appended after them.
+
+    Appended rows move the fences of their own cohorts only, so just those cohorts are recomputed.
+    """
+    new_rows = df.iloc[len(flags):]
+    if new_rows.empty:
+        return flags
+
+    touched = pd.MultiIndex.from_frame(df[by]).isin(pd.MultiIndex.from_frame(new_rows[by]))
+    updated = flags.reindex(df.index, fill_value=False)
+    updated.loc[touched] = flag_outliers(df[touched], value=value, by=by)
+    return updated
+
+
+def load_or_flag(path: str = 'ds_salaries.csv', cache_path: str = FLAGS_CACHE_PATH) -> pd.DataFrame:
+    data = read_source(path)
+    cached = load_sidecar(cache_path)
+    if cached is not None and cached.get('version') != FLAGS_VERSION:
+        cached = None
+    if cached is not None and cached['source_digest'] == digest(data):
+        return cached['flags']
+
+    df = pd.read_csv(path, sep=';')
+    if cached is not None and is_append_of(data, cached['source_digest'], cached['source_bytes']):
+        flags = update_outlier_flags(cached['flags'], df)
+    else:
+        flags = flag_outliers(df)
+
+    save_sidecar(cache_path, data, version=FLAGS_VERSION, flags=flags)
+    return flags
@@ -0,0 +1,208 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import pycountry
+
+from cache import Source, module_version, stage
+from export import cohort_mask
+from outliers import FLAG_COLUMNS, FLAGS_VERSION, load_or_flag
+from profiling import profile_frame
+from titles import canonicalize_titles
+
+SOURCE = Source('ds_salaries.csv')
+
+EXPERIENCE_LEVEL_MAPPING = {
+    'EN': 'Junior',
+    'MI': 'Middle',
+    'SE': 'Senior',
+    'EX': 'Director'
+}
+
+EMPLOYMENT_TYPE_MAPPING = {
+    'PT': 'Part-time',
+    'FT': 'Full-time',
+    'CT': 'Contract',
+    'FL': 'Freelance'
+}
+
+LOW_COUNT_LABEL = 'Less than 5 employees per country'
+
+GROWTH_DIMENSIONS = ['experience_level', 'employment_type', 'company_size', 'remote_ratio', 'employee_residence']
+ALL = 'All'
+
+# Stages below read the settings and helpers of this module and of the modules it imports
+VERSION = module_version(__name__)
+
+
+def percentage(a, b):
+    if a > b:
+        return round(a / b * 100 - 100)
+    else:
+        return round(b / a * 100 - 100)
+
+
+def add_job_title_columns(df: pd.DataFrame):
+    df['job_title_canonical'] = canonicalize_titles(df['job_title'])
+    # Same numbering as enumerating df['job_title_canonical'].unique(), starting at 1
+    df['job_title_numeric'] = pd.factorize(df['job_title_canonical'])[0] + 1
+
+
+def drop_local_salary(df: pd.DataFrame):
+    df.drop(columns=['salary_currency', 'salary'], inplace=True)
+
+
+def add_residence_iso_3(df: pd.DataFrame):
+    # Resolve each distinct country once instead of once per row
+    iso_3 = {country: pycountry.countries.get(alpha_2=country).alpha_3 for country in df['employee_residence'].unique()}
+    df['employee_residence_iso_3'] = df['employee_residence'].map(iso_3)
+
+
+def rename_codes(df: pd.DataFrame):
+    df['experience_level'] = df['experience_level'].replace(EXPERIENCE_LEVEL_MAPPING)
+    df['employment_type'] = df['employment_type'].replace(EMPLOYMENT_TYPE_MAPPING)
+
+
+# Applied in this order by transformed_frame, and shown step by step in app.py
+TRANSFORM_STEPS = [add_job_title_columns, drop_local_salary, add_residence_iso_3, rename_codes]
+
+
+def group_rare_countries(df: pd.DataFrame):
+    country_counts = df['employee_residence_iso_3'].value_counts()
+    low_count_countries = country_counts[country_counts < 5].index
+    df['employee_residence_grouped'] = df['employee_residence_iso_3'].where(
+        ~df['employee_residence_iso_3'].isin(low_count_countries), LOW_COUNT_LABEL
+    )
+
+
+def company_size_comparison(df: pd.DataFrame, large: str, small: str) -> pd.DataFrame:
+    """Mean salary of the ``large`` and ``small`` company cohorts of ``export.COHORTS``."""
+    return pd.DataFrame({
+        'company_size': ['L', 'S'],
+        'mean_salary': [df.loc[cohort_mask(df, large), 'salary_in_usd'].mean(), df.loc[cohort_mask(df, small), 'salary_in_usd'].mean()],
+    })
+
+
+@stage()
+def raw_frame(source: Source) -> pd.DataFrame:
+    return pd.read_csv(source.path, sep=';')
+
+
+@stage(version=VERSION, upstream=[raw_frame])
+def profile(raw: pd.DataFrame) -> dict:
+    return profile_frame(raw)
+
+
+@stage(version=FLAGS_VERSION)
+def outlier_flags(source: Source) -> pd.DataFrame:
+    return load_or_flag(source.path)
+
+
+@stage(version=VERSION, upstream=[raw_frame, outlier_flags])
+def transformed_frame(raw: pd.DataFrame, flags: pd.DataFrame) -> pd.DataFrame:
+    df = raw.copy()
+    for step in TRANSFORM_STEPS:
+        step(df)
+    df[FLAG_COLUMNS] = flags[FLAG_COLUMNS]
+    return df
+
+
+@stage(version=VERSION, upstream=[transformed_frame])
+def analysis_frame(transformed: pd.DataFrame, *, exclude_outliers: bool = False) -> pd.DataFrame:
+    df = transformed[~transformed['is_outlier']].copy() if exclude_outliers else transformed.copy()
+    group_rare_countries(df)
+    return df
+
+
+@stage(version=VERSION, upstream=[transformed_frame, analysis_frame])
+def aggregates(transformed: pd.DataFrame, df: pd.DataFrame) -> dict:
+    job_titles = transformed['job_title_canonical'].unique().tolist()
+    median_job_title = transformed['job_title_numeric'].median()
+
+    employee_residence = df[df['employee_residence_grouped'] != LOW_COUNT_LABEL]['employee_residence_grouped'].value_counts()
+    companies_df_dir_and_sen = company_size_comparison(df, 'large_companies_dir_and_sen', 'small_and_medium_companies_dir_and_sen')
+    companies_df_mid_and_jun = company_size_comparison(df, 'large_companies_mid_and_jun', 'small_and_medium_companies_mid_and_jun')
+
+    return {
+        'median_job_title': median_job_title,
+        'median_job_title_text': job_titles[int(median_job_title) - 1],
+        'experience_level': df['experience_level'].value_counts(),
+        'employee_residence_counts': df['employee_residence'].value_counts(),
+        'employee_residence': df['employee_residence_grouped'].value_counts(),
+        'aggregated_salaries': df.groupby('employee_residence_grouped')['salary_in_usd'].mean().reset_index(),
+        'salary_by_year': df.groupby('work_year')['salary_in_usd'].mean().reset_index(),
+        'salary_by_country_year': df.groupby(['employee_residence', 'work_year'])['salary_in_usd'].mean().reset_index(name='mean_salary'),
+        'filtered_companies_by_size': df.groupby('company_size')['salary_in_usd'].median(),
+        'employee_residence_filtered': pd.DataFrame({"residence": employee_residence.index.to_list(), 'number_of_programmers': employee_residence.values.tolist()}),
+        'fully_remote': df[cohort_mask(df, 'fully_remote')],
+        'seniors_and_directors': df[cohort_mask(df, 'seniors_and_directors')],
+        'juniors_and_middles': df[cohort_mask(df, 'juniors_and_middles')],
+        'companies_df_dir_and_sen': companies_df_dir_and_sen,
+        'companies_df_mid_and_jun': companies_df_mid_and_jun,
+        'change_sen_dir': percentage(*companies_df_dir_and_sen['mean_salary']),
+        'change_jun_mid': percentage(*companies_df_mid_and_jun['mean_salary']),
+    }
+
+
+def _cohort_categorical(values: pd.Series) -> pd.Categorical:
+    # Categories keep the order of the original values, so remote ratios sort 0, 50, 100, and ALL comes last
+    return pd.Categorical(values, categories=list(np.sort(values.unique())) + [ALL])
+
+
+def cohort_growth(df: pd.DataFrame) -> pd.DataFrame:
+    """Yearly mean, median and count of salaries for every cohort, with year-over-year changes.
+
+    A cohort fixes each of ``GROWTH_DIMENSIONS`` either to a value or to ``ALL``, from the
+    global trend to the fully specified cohorts. Sums and counts are taken once at the finest
+    grain and rolled up to every grouping set; medians do not roll up, so they are grouped
+    from the rows for each grouping set instead.
+    """
+    keys = GROWTH_DIMENSIONS + ['work_year']
+    rows = pd.DataFrame({dim: _cohort_categorical(df[dim]) for dim in GROWTH_DIMENSIONS})
+    rows['work_year'] = df['work_year'].to_numpy()
+    rows['salary_in_usd'] = df['salary_in_usd'].to_numpy()
+    finest = rows.groupby(keys, observed=True)['salary_in_usd'].agg(['sum', 'count'])
+
+    grouping_sets = []
+    for keep_flags in itertools.product([True, False], repeat=len(GROWTH_DIMENSIONS)):
+        kept = [dim for dim, keep in zip(GROWTH_DIMENSIONS, keep_flags) if keep] + ['work_year']
+        grouping_set = finest.groupby(kept, observed=True).sum()
+        grouping_set['median'] = rows.groupby(kept, observed=True)['salary_in_usd'].median()
+        grouping_set = grouping_set.reset_index()
+        for dim in GROWTH_DIMENSIONS:
+            if dim not in kept:
+                grouping_set[dim] = pd.Categorical([ALL] * len(grouping_set), categories=rows[dim].cat.categories)
+        grouping_sets.append(grouping_set)
+
+    growth = pd.concat(grouping_sets, ignore_index=True)
+    growth['mean'] = growth['sum'] / growth['count']
+    growth = growth[keys + ['mean', 'median', 'count']].sort_values(keys, ignore_index=True)
+
+    by_cohort = growth.groupby(GROWTH_DIMENSIONS, sort=False, observed=True)
+    growth['previous_year'] = by_cohort['work_year'].shift()
+    growth['mean_yoy'] = by_cohort['mean'].pct_change() * 100
+    growth['median_yoy'] = by_cohort['median'].pct_change() * 100
+    growth['count_yoy'] = by_cohort['count'].diff()
+    return growth.set_index(keys)
+
+
+def growth_figure(cohort: pd.DataFrame) -> go.Figure:
+    growth_plot = px.line(
+        cohort.reset_index(),
+        x='work_year',
+        y=['mean', 'median'],
+        title='Salary Change of the Selected Cohort',
+        labels={'work_year': 'Year', 'value': 'Salary (USD)', 'variable': 'Statistic'},
+        markers=True,
+        template='plotly_white'
+    )
+
+    growth_plot.update_layout(
+        xaxis=dict(
+            tickmode='linear',
+            dtick=1
+        ),
+    )
+    return growth_plot
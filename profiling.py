@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+TOP_K = 20
+
+
+def profile_frame(df: pd.DataFrame, top_k: int = TOP_K) -> dict:
+    """Builds the column profile rendered by the descriptive statistics section.
+
+    Holds the head, null counts, numeric summaries (as ``df.describe()``), per-column
+    summaries (as ``df[col].describe()``), cardinalities and the ``top_k`` most frequent values.
+    """
+    summaries = {}
+    cardinality = {}
+    value_counts = {}
+    for col in df.columns:
+        counts = df[col].value_counts()
+        cardinality[col] = len(counts)
+        value_counts[col] = counts.head(top_k)
+        if pd.api.types.is_numeric_dtype(df[col]):
+            summaries[col] = df[col].describe()
+        else:
+            # Same fields as describe() on an object column, reusing the counts above;
+            # like describe(), a column without any value has no top value
+            summaries[col] = pd.Series(
+                [df[col].count(), len(counts), counts.index[0] if len(counts) else np.nan, counts.iloc[0] if len(counts) else np.nan],
+                index=['count', 'unique', 'top', 'freq'],
+                name=col,
+                dtype=object,
+            )
+
+    numeric = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+    return {
+        'n_rows': len(df),
+        'head': df.head(),
+        'null_counts': df.isna().sum(),
+        'describe': pd.DataFrame({col: summaries[col] for col in numeric}),
+        'summaries': summaries,
+        'cardinality': pd.Series(cardinality),
+        'value_counts': value_counts,
+    }
+
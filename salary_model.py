@@ -0,0 +1,189 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+from cache import module_version
+from dataset import CACHE_DIR, digest, is_append_of, load_sidecar, read_source, save_sidecar
+
+CATEGORICAL_FEATURES = [
+    'experience_level',
+    'employment_type',
+    'job_title',
+    'employee_residence',
+    'company_size',
+    'remote_ratio',
+]
+NUMERIC_FEATURES = ['work_year']
+FEATURES = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+TARGET = 'salary_in_usd'
+
+BASE_YEAR = 2020
+ALPHA = 1.0
+CHUNK_SIZE = 100_000
+MODEL_CACHE_PATH = os.path.join(CACHE_DIR, 'salary_model.pkl')
+# A model cached by an older version of the features, the penalty or the code below is retrained
+MODEL_VERSION = module_version(__name__)
+
+
+class SalaryModel:
+    """Ridge regression on log salary over one-hot encoded categorical columns.
+
+    Training only keeps the sufficient statistics ``X'X`` and ``X'y``, so new rows
+    can be folded in with ``partial_fit`` without revisiting the old ones.
+    Column 0 is the intercept and column 1 is the centered year; every category
+    level seen during training gets its own column after that.
+    """
+
+    def __init__(self, alpha: float = ALPHA):
+        self.alpha = alpha
+        self.levels = {col: {} for col in CATEGORICAL_FEATURES}
+        self.n_features = 1 + len(NUMERIC_FEATURES)
+        self.xtx = np.zeros((self.n_features, self.n_features))
+        self.xty = np.zeros(self.n_features)
+        self.n_rows = 0
+        self.coef = np.zeros(self.n_features)
+
+    def _grow(self, frame: pd.DataFrame):
+        for col in CATEGORICAL_FEATURES:
+            levels = self.levels[col]
+            for value in pd.unique(frame[col]):
+                if value not in levels:
+                    levels[value] = self.n_features
+                    self.n_features += 1
+
+        # Old rows are zero in any newly added column, so padding keeps the statistics exact
+        grow_by = self.n_features - len(self.xty)
+        if grow_by:
+            self.xtx = np.pad(self.xtx, ((0, grow_by), (0, grow_by)))
+            self.xty = np.pad(self.xty, (0, grow_by))
+            self.coef = np.pad(self.coef, (0, grow_by))
+
+    def _codes(self, frame: pd.DataFrame) -> dict:
+        # Unknown levels map to -1 and contribute nothing to the score
+        return {
+            col: frame[col].map(self.levels[col]).fillna(-1).to_numpy(dtype=np.int64)
+            for col in CATEGORICAL_FEATURES
+        }
+
+    def _numeric(self, frame: pd.DataFrame) -> np.ndarray:
+        return frame[NUMERIC_FEATURES].to_numpy(dtype=float) - BASE_YEAR
+
+    def _design(self, frame: pd.DataFrame) -> np.ndarray:
+        rows = np.arange(len(frame))
+        design = np.zeros((len(frame), self.n_features))
+        design[:, 0] = 1.0
+        design[:, 1:1 + len(NUMERIC_FEATURES)] = self._numeric(frame)
+        for codes in self._codes(frame).values():
+            known = codes >= 0
+            design[rows[known], codes[known]] = 1.0
+        return design
+
+    def partial_fit(self, frame: pd.DataFrame) -> 'SalaryModel':
+        if frame.empty:
+            return self
+
+        self._grow(frame)
+        for start in range(0, len(frame), CHUNK_SIZE):
+            chunk = frame.iloc[start:start + CHUNK_SIZE]
+            design = self._design(chunk)
+            target = np.log(chunk[TARGET].to_numpy(dtype=float))
+            self.xtx += design.T @ design
+            self.xty += design.T @ target
+        self.n_rows += len(frame)
+
+        penalty = np.full(self.n_features, self.alpha)
+        penalty[0] = 0.0
+        self.coef = np.linalg.solve(self.xtx + np.diag(penalty), self.xty)
+        return self
+
+    def predict(self, frame: pd.DataFrame) -> np.ndarray:
+        log_salary = self.coef[0] + self._numeric(frame) @ self.coef[1:1 + len(NUMERIC_FEATURES)]
+        # Index -1 points at a padding zero so unknown levels drop out of the sum
+        weights = np.append(self.coef, 0.0)
+        for codes in self._codes(frame).values():
+            log_salary += weights[codes]
+        return np.exp(log_salary)
+
+
+def load_or_train(path: str = 'ds_salaries.csv', cache_path: str = MODEL_CACHE_PATH) -> SalaryModel:
+    data = read_source(path)
+    cached = load_sidecar(cache_path)
+    if cached is not None and cached.get('version') != MODEL_VERSION:
+        cached = None
+    if cached is not None and cached['source_digest'] == digest(data):
+        return cached['model']
+
+    df = pd.read_csv(path, sep=';')
+    if cached is not None and is_append_of(data, cached['source_digest'], cached['source_bytes']):
+        # The file only grew at the end, so fold in just the appended rows
+        model = cached['model']
+        model.partial_fit(df.iloc[model.n_rows:])
+    else:
+        model = SalaryModel().partial_fit(df)
+
+    save_sidecar(cache_path, data, version=MODEL_VERSION, model=model)
+    return model
+
+
+class MicroBatcher:
+    """Collects scoring requests from concurrent sessions and scores them in one pass.
+
+    The first request starts a batch, then the worker waits up to ``max_wait`` seconds
+    for more requests (or until ``max_batch_size`` rows are queued) before calling
+    ``score_fn`` once on all of them. ``score_fn`` can be replaced while the worker runs,
+    for example with the model of a new data version; each batch uses the one set when
+    the batch is scored.
+    """
+
+    def __init__(self, score_fn, max_batch_size: int = 1024, max_wait: float = 0.005):
+        self.score_fn = score_fn
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, frame: pd.DataFrame) -> Future:
+        future = Future()
+        self._queue.put((frame, future))
+        return future
+
+    def score(self, frame: pd.DataFrame) -> np.ndarray:
+        return self.submit(frame).result()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        n_rows = len(batch[0][0])
+        deadline = time.monotonic() + self._max_wait
+        while n_rows < self._max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            frames = [frame for frame, _ in batch]
+            try:
+                scores = self.score_fn(pd.concat(frames, ignore_index=True))
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            offset = 0
+            for frame, future in batch:
+                future.set_result(scores[offset:offset + len(frame)])
+                offset += len(frame)
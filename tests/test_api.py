@@ -0,0 +1,64 @@
+import http.client
+import json
+
+import pytest
+
+import api
+import pipeline
+from export import iter_export
+
+
+@pytest.fixture(scope='module')
+def connection():
+    server = api.serve_in_background(0)
+    yield http.client.HTTPConnection(*server.server_address)
+    server.shutdown()
+
+
+def get(connection, path: str):
+    connection.request('GET', path)
+    response = connection.getresponse()
+    return response, response.read()
+
+
+def test_export_is_streamed_in_chunks(connection):
+    response, body = get(connection, '/export/fully_remote.csv?exclude_outliers=true')
+    assert response.status == 200
+    assert response.getheader('Transfer-Encoding') == 'chunked'
+    assert response.getheader('Content-Disposition') == 'attachment; filename="fully_remote.csv"'
+    df = pipeline.analysis_frame(pipeline.SOURCE, exclude_outliers=True)
+    assert body == b''.join(iter_export(df, 'fully_remote', 'csv'))
+
+
+def test_unknown_export_is_not_found(connection):
+    assert get(connection, '/export/fully_remote.xlsx')[0].status == 404
+    assert get(connection, '/export/nobody.csv')[0].status == 404
+
+
+def test_json_routes_revalidate_with_etag(connection):
+    response, _ = get(connection, '/salaries/company-size-difference')
+    connection.request('GET', '/salaries/company-size-difference', headers={'If-None-Match': response.getheader('ETag')})
+    revalidated = connection.getresponse()
+    revalidated.read()
+    assert revalidated.status == 304
+
+
+def test_etag_follows_the_stage_key(connection, monkeypatch):
+    etag = get(connection, '/salaries/company-size-difference')[0].getheader('ETag')
+    monkeypatch.setattr(pipeline.aggregates, 'version', 'edited')
+    response, _ = get(connection, '/salaries/company-size-difference')
+    assert response.status == 200
+    assert response.getheader('ETag') != etag
+    assert get(connection, '/value-counts/company_size')[0].getheader('ETag') is not None
+
+
+def test_failing_route_answers_with_json_error(connection, monkeypatch):
+    def fail(exclude_outliers):
+        raise RuntimeError('broken')
+
+    monkeypatch.setitem(api.ROUTES, ('salaries', 'by-country-year'), (pipeline.aggregates, fail))
+    monkeypatch.setattr(api.Handler, 'responses_cache', api.ResponseCache())
+    response, body = get(connection, '/salaries/by-country-year')
+    assert response.status == 500
+    assert json.loads(body) == {'error': 'failed to build /salaries/by-country-year'}
+    assert get(connection, '/salaries/company-size-difference')[0].status == 200
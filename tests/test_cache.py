@@ -0,0 +1,163 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+import cache
+from cache import DiskStore, Source, Stage, code_version, module_version
+
+
+def make_fn(body: str, name: str = 'step'):
+    namespace = {}
+    exec(f'def {name}(value, *, scale=1):\n    {body}\n', namespace)
+    return namespace[name]
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'data.txt'
+    path.write_text('1')
+    return Source(str(path))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DiskStore(str(tmp_path / 'stages'))
+
+
+def read(source):
+    with open(source.path) as f:
+        return int(f.read())
+
+
+def test_source_fingerprint_follows_content(source):
+    before = source.fingerprint
+    assert source.fingerprint == before
+    with open(source.path, 'w') as f:
+        f.write('22')
+    assert source.fingerprint != before
+
+
+def test_code_version_changes_with_body_only():
+    assert code_version(make_fn('return value + 1')) == code_version(make_fn('return value + 1'))
+    assert code_version(make_fn('return value + 1')) != code_version(make_fn('return value + 2'))
+
+
+def test_stage_key_changes_with_data(source, store):
+    load = Stage(read, store=store)
+    key = load.key(source)
+    assert load(source) == 1
+
+    with open(source.path, 'w') as f:
+        f.write('22')
+    assert load.key(source) != key
+    assert load(source) == 22
+
+
+def test_stage_key_changes_with_upstream_code(source, store):
+    load = Stage(read, store=store)
+    double = Stage(make_fn('return value * 2 * scale'), upstream=[load], store=store)
+    triple = Stage(make_fn('return value * 3 * scale'), upstream=[load], store=store)
+    assert double.key(source) != triple.key(source)
+
+    changed_load = Stage(make_fn('return read(value) + 1', name='read'), store=store)
+    changed_load.fn.__globals__['read'] = read
+    downstream = Stage(double.fn, upstream=[changed_load], store=store)
+    assert downstream.key(source) != double.key(source)
+    assert downstream(source) == 4
+
+
+def test_stage_key_includes_keyword_params_and_version(source, store):
+    load = Stage(read, store=store)
+    scaled = Stage(make_fn('return value * scale'), upstream=[load], store=store)
+    assert scaled.key(source, scale=1) != scaled.key(source, scale=2)
+    assert scaled(source, scale=3) == 3
+    # Parameters a stage does not accept do not split its cache
+    assert load.key(source, scale=1) == load.key(source, scale=2)
+    assert Stage(read, version=2, store=store).key(source) != load.key(source)
+
+
+def test_stage_reuses_disk_results_across_instances(source, store):
+    calls = []
+
+    def count(value):
+        calls.append(value)
+        return read(value)
+
+    assert Stage(count, store=store)(source) == 1
+    assert Stage(count, store=store)(source) == 1
+    assert len(calls) == 1
+
+
+def test_disk_store_evicts_least_recently_used(tmp_path):
+    store = DiskStore(str(tmp_path), max_bytes=10 ** 9)
+    payload = b'x' * 1000
+    for i, key in enumerate(['a', 'b', 'c']):
+        store.put(key, payload)
+        os.utime(store._path(key), ns=(i * 10 ** 9, i * 10 ** 9))
+    # Reading 'a' makes it the most recently used entry
+    store.get('a')
+
+    store.max_bytes = 2 * os.path.getsize(store._path('a'))
+    store.evict()
+    assert store.get('a') == payload
+    assert store.get('c') == payload
+    with pytest.raises(KeyError):
+        store.get('b')
+
+
+def test_disk_store_get_of_corrupt_entry_is_a_miss(tmp_path):
+    store = DiskStore(str(tmp_path))
+    store.put('a', 1)
+    with open(store._path('a'), 'wb') as f:
+        f.write(b'not a pickle')
+    with pytest.raises(KeyError):
+        store.get('a')
+
+
+def test_module_version_covers_settings(tmp_path, monkeypatch):
+    module_path = tmp_path / 'settings_module.py'
+    module_path.write_text('THRESHOLD = 1.5\n\ndef flag(x):\n    return x > THRESHOLD\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module('settings_module')
+    try:
+        before = module_version(module)
+        module_path.write_text('THRESHOLD = 0.1\n\ndef flag(x):\n    return x > THRESHOLD\n')
+        assert module_version(module) != before
+    finally:
+        sys.modules.pop('settings_module', None)
+
+
+# A pickle of a class pandas 1.5 had and pandas 2 removed
+STALE_PICKLE = b'cpandas.core.indexes.numeric\nInt64Index\n(tR.'
+
+
+def test_entries_from_other_library_versions_are_a_miss(source, store):
+    load = Stage(read, store=store)
+    os.makedirs(store.root, exist_ok=True)
+    with open(store._path(load.key(source)), 'wb') as f:
+        f.write(STALE_PICKLE)
+    with pytest.raises(KeyError):
+        store.get(load.key(source))
+    assert load(source) == 1
+    assert store.get(load.key(source)) == 1
+
+
+def test_stage_key_covers_library_versions(source, store, monkeypatch):
+    load = Stage(read, store=store)
+    key = load.key(source)
+    monkeypatch.setattr(cache, 'LIBRARY_VERSIONS', (('pandas', '1.5.2'),))
+    assert load.key(source) != key
+
+
+def test_failed_put_leaves_no_temp_file(tmp_path, monkeypatch):
+    store = DiskStore(str(tmp_path))
+    store.put('a', 1)
+
+    def fail(src, dst):
+        raise OSError('disk full')
+    monkeypatch.setattr(os, 'replace', fail)
+    with pytest.raises(OSError):
+        store.put('b', 2)
+    assert os.listdir(tmp_path) == ['a.pkl']
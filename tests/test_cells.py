@@ -0,0 +1,144 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cache
+import cells
+from cache import DiskStore
+from cells import Cell, Notebook
+
+
+@pytest.fixture
+def notebook(tmp_path):
+    def make(**inputs):
+        return Notebook(inputs=inputs, store=DiskStore(str(tmp_path / 'cells')))
+    return make
+
+
+@pytest.mark.parametrize('source, reads, writes', [
+    ('y = x + 1', {'x'}, {'y'}),
+    ('a = 1\nb = a + c', {'c'}, {'a', 'b'}),
+    ('x += 1', {'x'}, {'x'}),
+    ('total = 0\ntotal += step', {'step'}, {'total'}),
+    ("df['b'] = 1", {'df'}, {'df'}),
+    ("df.drop(columns='a', inplace=True)", {'df'}, {'df'}),
+    ('items.append(1)', {'items'}, {'items'}),
+    ('ys = [x * k for x in xs]', {'k', 'xs'}, {'ys'}),
+    ('pairs = {key: value for key, value in mapping.items() if key}', {'mapping'}, {'pairs'}),
+    ('f = lambda v: v + offset', {'offset'}, {'f'}),
+    ('import numpy as np\nfrom pipeline import SOURCE', set(), {'np', 'SOURCE'}),
+])
+def test_cell_reads_and_writes(source, reads, writes):
+    cell = Cell(source)
+    assert cell.reads == reads
+    assert cell.writes == writes
+
+
+def test_augmented_assignment_reads_its_target(notebook):
+    nb = notebook(x=1)
+    nb.run(Cell('x += 1'))
+    assert nb['x'] == 2
+    assert nb.inputs['x'] == 1
+
+
+def test_unlisted_in_place_changes_do_not_leak(notebook):
+    values = [3, 1, 2]
+    array = np.arange(10)
+    nb = notebook(values=values, array=array, np=np)
+    assert nb.run(Cell('values.sort()\nvalues')).value == [1, 2, 3]
+    nb.run(Cell('np.random.shuffle(array)\narray.sum()'))
+    assert values == [3, 1, 2]
+    assert (array == np.arange(10)).all()
+
+
+def test_frame_changes_stay_in_the_cell_that_makes_them(notebook):
+    nb = notebook(pd=pd)
+    first = nb.run(Cell("frame = pd.DataFrame({'a': [1, 2]})"))
+    nb.run(Cell("frame['b'] = frame['a'] * 2\nframe.loc[0, 'a'] = 100"))
+    assert list(nb['frame'].columns) == ['a', 'b']
+
+    cached = Notebook._memory[first.key]['outputs']['frame']
+    assert list(cached.columns) == ['a']
+    assert cached['a'].tolist() == [1, 2]
+
+
+def test_results_are_reused_until_an_input_changes(notebook):
+    nb = notebook(factor=2)
+    nb.run(Cell('import pandas as pd'))
+    first = nb.run(Cell('doubled = pd.Series([1, 2]) * factor'))
+    assert first.key in Notebook._memory
+
+    same = notebook(factor=2)
+    same.run(Cell('import pandas as pd'))
+    assert same.run(Cell('doubled = pd.Series([1, 2]) * factor')).key == first.key
+
+    changed = notebook(factor=3)
+    changed.run(Cell('import pandas as pd'))
+    cell = changed.run(Cell('doubled = pd.Series([1, 2]) * factor'))
+    assert cell.key != first.key
+    assert changed['doubled'].tolist() == [3, 6]
+
+
+def test_frame_inputs_are_keyed_by_their_content(notebook):
+    frame = pd.DataFrame({'x': range(1000)})
+    assert notebook(frame=frame).run(Cell('frame["x"].sum()')).value == 499500
+
+    edited = frame.copy()
+    edited.loc[500, 'x'] = 1000
+    assert notebook(frame=edited).run(Cell('frame["x"].sum()')).value == 499500 + 500
+
+
+def test_cells_reading_unhashable_inputs_are_not_cached(notebook):
+    nb = notebook(frame=pd.DataFrame({'tags': [['a'], ['b']]}))
+    first = nb.run(Cell('count = len(frame)'))
+    below = nb.run(Cell('doubled = count * 2'))
+    assert first.key not in Notebook._memory
+
+    again = notebook(frame=pd.DataFrame({'tags': [['a'], ['b'], ['c']]}))
+    assert again.run(Cell('count = len(frame)')).key != first.key
+    assert again.run(Cell('doubled = count * 2')).key != below.key
+    assert again['doubled'] == 6
+
+
+def test_uncached_cells_run_every_time(notebook):
+    nb = notebook(values=[1])
+    cell = nb.run(Cell('values.append(2)\nlen(values)'), cache=False)
+    assert cell.value == 2
+    assert cell.key not in Notebook._memory
+
+
+def test_key_follows_project_module_settings(notebook, tmp_path, monkeypatch):
+    module_path = tmp_path / 'scoring.py'
+    module_path.write_text('THRESHOLD = 1\n\ndef above(x):\n    return x > THRESHOLD\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(cache, 'PROJECT_DIR', str(tmp_path))
+
+    def keys():
+        nb = notebook()
+        imported = nb.run(Cell('from scoring import THRESHOLD, above'))
+        return imported.key, nb.run(Cell('above(2)')).key, nb.run(Cell('THRESHOLD * 2')).key
+
+    try:
+        before = keys()
+        # Only the setting changes, the bytecode of above() stays the same
+        module_path.write_text('THRESHOLD = 50\n\ndef above(x):\n    return x > THRESHOLD\n')
+        after = keys()
+    finally:
+        sys.modules.pop('scoring', None)
+    assert all(old != new for old, new in zip(before, after))
+
+
+def test_stored_cells_from_other_library_versions_are_a_miss(notebook, tmp_path, monkeypatch):
+    nb = notebook(factor=2)
+    cell = Cell('factor * 2')
+    monkeypatch.setattr(cells, 'CACHE_MODE', 'disk')
+    nb.run(cell)
+    Notebook._memory.pop(cell.key)
+    with open(nb.store._path(cell.key), 'wb') as f:
+        f.write(b'cpandas.core.indexes.numeric\nInt64Index\n(tR.')
+    assert notebook(factor=2).run(Cell('factor * 2')).value == 4
+
+    monkeypatch.setattr(cells, 'LIBRARY_VERSIONS', (('pandas', '1.5.2'),))
+    assert notebook(factor=2).run(Cell('factor * 2')).key != cell.key
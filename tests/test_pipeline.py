@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from pipeline import ALL, GROWTH_DIMENSIONS, cohort_growth
+
+
+def make_frame(n_rows: int = 400, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'experience_level': rng.choice(['Junior', 'Middle', 'Senior'], n_rows),
+        'employment_type': rng.choice(['Full-time', 'Contract'], n_rows),
+        'company_size': rng.choice(['S', 'M', 'L'], n_rows),
+        'remote_ratio': rng.choice([0, 50, 100], n_rows),
+        'employee_residence': rng.choice(['US', 'DE', 'IN'], n_rows),
+        'work_year': rng.choice([2020, 2021, 2022], n_rows),
+        'salary_in_usd': rng.integers(20_000, 300_000, n_rows),
+    })
+
+
+def test_cohort_growth_matches_direct_grouping():
+    df = make_frame()
+    growth = cohort_growth(df)
+
+    overall = df.groupby('work_year')['salary_in_usd'].agg(['mean', 'median', 'count'])
+    pd.testing.assert_frame_equal(growth.loc[(ALL,) * len(GROWTH_DIMENSIONS)][['mean', 'median', 'count']], overall)
+
+    cohort = ('Senior', ALL, 'L', 50, ALL)
+    rows = df[(df['experience_level'] == 'Senior') & (df['company_size'] == 'L') & (df['remote_ratio'] == 50)]
+    expected = rows.groupby('work_year')['salary_in_usd'].agg(['mean', 'median', 'count'])
+    pd.testing.assert_frame_equal(growth.loc[cohort][['mean', 'median', 'count']], expected)
+    np.testing.assert_allclose(growth.loc[cohort]['mean_yoy'].iloc[1:], expected['mean'].pct_change().iloc[1:] * 100)
+
+
+def test_cohort_growth_orders_cohorts_by_original_values():
+    growth = cohort_growth(make_frame())
+    assert list(growth.index.unique('remote_ratio').sort_values()) == [0, 50, 100, ALL]
+    assert growth.index.is_monotonic_increasing
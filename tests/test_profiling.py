@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from profiling import profile_frame
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'salary': [100, 250, 250, 80, np.nan],
+        'level': ['SE', 'MI', 'SE', None, 'EN'],
+        'empty': pd.Series([None] * 5, dtype=object),
+    })
+
+
+def test_profile_matches_pandas(frame):
+    profile = profile_frame(frame, top_k=2)
+
+    assert profile['n_rows'] == len(frame)
+    pd.testing.assert_frame_equal(profile['head'], frame.head())
+    pd.testing.assert_series_equal(profile['null_counts'], frame.isna().sum())
+    pd.testing.assert_frame_equal(profile['describe'], frame.describe())
+    for col in frame.columns:
+        assert profile['cardinality'][col] == frame[col].nunique()
+        pd.testing.assert_series_equal(profile['value_counts'][col], frame[col].value_counts().head(2))
+
+
+def test_summaries_match_describe(frame):
+    summaries = profile_frame(frame)['summaries']
+    pd.testing.assert_series_equal(summaries['salary'], frame['salary'].describe())
+    for col in ['level', 'empty']:
+        expected = frame[col].describe()
+        assert summaries[col].index.tolist() == expected.index.tolist()
+        for field in expected.index:
+            if pd.isna(expected[field]):
+                assert pd.isna(summaries[col][field])
+            else:
+                assert summaries[col][field] == expected[field]
+
+
+def test_profile_of_the_dataset_runs():
+    df = pd.read_csv('ds_salaries.csv', sep=';')
+    profile = profile_frame(df)
+    assert profile['cardinality']['job_title'] == df['job_title'].nunique()
@@ -0,0 +1,81 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from salary_model import MicroBatcher
+
+
+class RecordingScorer:
+    def __init__(self, offset: float = 0.0):
+        self.offset = offset
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, frame: pd.DataFrame) -> np.ndarray:
+        with self._lock:
+            self.batches.append(len(frame))
+        return frame['x'].to_numpy(dtype=float) + self.offset
+
+
+def frames(n: int) -> list:
+    # Frames of different sizes, so misaligned splits would show up
+    return [pd.DataFrame({'x': np.arange(i + 1) + 100 * i}) for i in range(n)]
+
+
+def test_concurrent_submits_share_one_score_call():
+    scorer = RecordingScorer()
+    batcher = MicroBatcher(scorer, max_wait=1.0)
+    inputs = frames(8)
+    results = [None] * len(inputs)
+    start = threading.Barrier(len(inputs))
+
+    def session(index: int):
+        start.wait()
+        results[index] = batcher.score(inputs[index])
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(len(inputs))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert scorer.batches == [sum(len(frame) for frame in inputs)]
+    for frame, result in zip(inputs, results):
+        np.testing.assert_array_equal(result, frame['x'].to_numpy(dtype=float))
+
+
+def test_batches_stop_at_max_batch_size():
+    scorer = RecordingScorer()
+    batcher = MicroBatcher(scorer, max_batch_size=3, max_wait=1.0)
+    futures = [batcher.submit(pd.DataFrame({'x': [i, i]})) for i in range(4)]
+    assert [future.result(timeout=5).tolist() for future in futures] == [[i, i] for i in range(4)]
+    assert scorer.batches == [4, 4]
+
+
+def test_exception_reaches_every_future_of_the_batch():
+    def fail(frame):
+        raise ValueError('model not ready')
+
+    batcher = MicroBatcher(fail, max_wait=1.0)
+    futures = [batcher.submit(frame) for frame in frames(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match='model not ready'):
+            future.result(timeout=5)
+
+    # The worker keeps serving after a failed batch
+    batcher.score_fn = RecordingScorer()
+    assert batcher.score(pd.DataFrame({'x': [1]})).tolist() == [1]
+
+
+def test_swapped_score_fn_is_used_by_later_batches():
+    first, second = RecordingScorer(), RecordingScorer(offset=1000)
+    batcher = MicroBatcher(first, max_wait=0.001)
+    assert batcher.score(pd.DataFrame({'x': [1, 2]})).tolist() == [1, 2]
+
+    worker = batcher._worker
+    batcher.score_fn = second
+    assert batcher.score(pd.DataFrame({'x': [1, 2]})).tolist() == [1001, 1002]
+    assert first.batches == [2] and second.batches == [2]
+    assert batcher._worker is worker and worker.is_alive()
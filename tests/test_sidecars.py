@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset
+import outliers
+import salary_model
+from dataset import load_pickle, load_sidecar, save_pickle
+from outliers import FLAG_COLUMNS, flag_outliers, load_or_flag, update_outlier_flags
+from salary_model import SalaryModel, load_or_train
+
+SOURCE_PATH = 'ds_salaries.csv'
+
+
+@pytest.fixture(scope='module')
+def lines():
+    with open(SOURCE_PATH) as f:
+        return f.readlines()
+
+
+@pytest.fixture
+def grown_csv(tmp_path, lines):
+    """A copy of the first 400 rows, and a function that appends the rest of the dataset."""
+    path = tmp_path / 'salaries.csv'
+    path.write_text(''.join(lines[:401]))
+
+    def append():
+        with open(path, 'a') as f:
+            f.writelines(lines[401:])
+
+    return str(path), append
+
+
+def test_update_outlier_flags_matches_full_flagging():
+    df = pd.read_csv(SOURCE_PATH, sep=';')
+    flags = update_outlier_flags(flag_outliers(df.iloc[:400]), df)
+    pd.testing.assert_frame_equal(flags, flag_outliers(df))
+
+
+def test_load_or_flag_appends_incrementally(grown_csv, tmp_path, monkeypatch):
+    path, append = grown_csv
+    cache_path = str(tmp_path / 'flags.pkl')
+    load_or_flag(path, cache_path)
+    append()
+
+    flagged_rows = []
+    def spy(df, **kwargs):
+        flagged_rows.append(len(df))
+        return flag_outliers(df, **kwargs)
+    monkeypatch.setattr(outliers, 'flag_outliers', spy)
+
+    flags = load_or_flag(path, cache_path)
+    full = flag_outliers(pd.read_csv(path, sep=';'))
+    pd.testing.assert_frame_equal(flags[FLAG_COLUMNS], full[FLAG_COLUMNS])
+    # Only the cohorts the appended rows fall into were recomputed
+    assert flagged_rows and flagged_rows[0] < len(full)
+    assert load_sidecar(cache_path)['source_bytes'] == len(open(path, 'rb').read())
+
+
+def test_load_or_flag_recomputes_on_version_change(grown_csv, tmp_path, monkeypatch):
+    path, _ = grown_csv
+    cache_path = str(tmp_path / 'flags.pkl')
+    flags = load_or_flag(path, cache_path)
+
+    monkeypatch.setattr(outliers, 'FLAGS_VERSION', 'changed')
+    monkeypatch.setattr(outliers, 'IQR_FACTOR', 0.1)
+    assert load_or_flag(path, cache_path)['is_outlier'].sum() > flags['is_outlier'].sum()
+    assert load_sidecar(cache_path)['version'] == 'changed'
+
+
+def test_partial_fit_in_chunks_matches_full_fit(monkeypatch):
+    df = pd.read_csv(SOURCE_PATH, sep=';')
+    full = SalaryModel().partial_fit(df)
+
+    monkeypatch.setattr(salary_model, 'CHUNK_SIZE', 97)
+    chunked = SalaryModel()
+    for start in range(0, len(df), 250):
+        chunked.partial_fit(df.iloc[start:start + 250])
+
+    assert chunked.n_rows == full.n_rows == len(df)
+    np.testing.assert_allclose(chunked.predict(df), full.predict(df), rtol=1e-6)
+
+
+def test_load_or_train_appends_incrementally(grown_csv, tmp_path):
+    path, append = grown_csv
+    cache_path = str(tmp_path / 'model.pkl')
+    assert load_or_train(path, cache_path).n_rows == 400
+    append()
+
+    df = pd.read_csv(path, sep=';')
+    model = load_or_train(path, cache_path)
+    assert model.n_rows == len(df)
+    np.testing.assert_allclose(model.predict(df), SalaryModel().partial_fit(df).predict(df), rtol=1e-6)
+
+
+def test_load_or_train_retrains_on_version_change(grown_csv, tmp_path, monkeypatch):
+    path, _ = grown_csv
+    cache_path = str(tmp_path / 'model.pkl')
+    model = load_or_train(path, cache_path)
+
+    monkeypatch.setattr(salary_model, 'MODEL_VERSION', 'changed')
+    assert load_or_train(path, cache_path) is not model
+    assert load_sidecar(cache_path)['version'] == 'changed'
+
+
+def test_unreadable_pickle_is_a_miss(tmp_path):
+    path = str(tmp_path / 'sidecar.pkl')
+    save_pickle(path, {'source_digest': 'x'})
+    with open(path, 'r+b') as f:
+        f.truncate(5)
+    assert load_pickle(path) is None
+    with open(path, 'wb') as f:
+        f.write(b'garbage')
+    assert load_sidecar(path) is None
+
+
+def test_cache_mode_applies_to_sidecars(tmp_path, monkeypatch):
+    path = str(tmp_path / 'sidecar.pkl')
+    value = {'source_digest': 'x', 'rows': [1, 2]}
+
+    monkeypatch.setattr(dataset, 'CACHE_MODE', 'off')
+    save_pickle(path, value)
+    assert load_pickle(path) is None
+
+    monkeypatch.setattr(dataset, 'CACHE_MODE', 'memory')
+    save_pickle(path, value)
+    loaded = load_pickle(path)
+    # Kept in memory only, and every load is a copy callers may change
+    assert loaded == value and loaded is not value
+    loaded['rows'].append(3)
+    assert load_pickle(path) == value
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+import titles
+from titles import TitleIndex, canonicalize_titles, load_title_index
+
+
+@pytest.mark.parametrize('raw, canonical', [
+    ('Data Scientist', 'Data Scientist'),
+    ('ML Engineer', 'Machine Learning Engineer'),
+    ('Lead Machine Learning Engineer', 'Machine Learning Engineer'),
+    ('Sr Data Scientist', 'Data Scientist'),
+    ('BI Data Analyst', 'Business Intelligence Analyst'),
+    ('Finance Data Analyst', 'Financial Data Analyst'),
+    ('Chef', 'Chef'),
+])
+def test_match(raw, canonical):
+    assert TitleIndex().match(raw) == canonical
+
+
+def test_missing_titles_stay_missing():
+    index = TitleIndex()
+    result = index.canonicalize(pd.Series(['ML Engineer', None, 'Data Analyst'], index=[10, 11, 12], name='job_title'))
+    assert result.tolist() == ['Machine Learning Engineer', None, 'Data Analyst']
+    assert result.index.tolist() == [10, 11, 12] and result.name == 'job_title'
+    assert index.canonicalize(pd.Series([None, None], dtype=object)).tolist() == [None, None]
+
+
+def test_only_unseen_titles_are_matched(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'title_map.pkl')
+    matched = []
+    match = TitleIndex.match
+    def spy(self, title):
+        matched.append(title)
+        return match(self, title)
+    monkeypatch.setattr(TitleIndex, 'match', spy)
+
+    canonicalize_titles(pd.Series(['ML Engineer', 'Data Analyst', 'ML Engineer']), cache_path)
+    assert sorted(matched) == ['Data Analyst', 'ML Engineer']
+    matched.clear()
+
+    result = canonicalize_titles(pd.Series(['Data Analyst', 'Lead Data Engineer', 'ML Engineer']), cache_path)
+    assert matched == ['Lead Data Engineer']
+    assert result.tolist() == ['Data Analyst', 'Data Engineer', 'Machine Learning Engineer']
+    assert set(load_title_index(cache_path).mapping) == {'ML Engineer', 'Data Analyst', 'Lead Data Engineer'}
+
+
+def test_taxonomy_change_drops_remembered_matches(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'title_map.pkl')
+    canonicalize_titles(pd.Series(['ML Engineer']), cache_path)
+    assert 'ML Engineer' in load_title_index(cache_path).mapping
+
+    monkeypatch.setattr(titles, 'TAXONOMY_VERSION', 'changed')
+    assert load_title_index(cache_path).mapping == {}
+    canonicalize_titles(pd.Series(['ML Engineer']), cache_path)
+    assert load_title_index(cache_path).version == 'changed'
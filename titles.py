@@ -0,0 +1,133 @@
+import os
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from cache import module_version
+from dataset import CACHE_DIR, load_pickle, save_pickle
+
+CANONICAL_TITLES = [
+    'Data Scientist',
+    'Data Analyst',
+    'Financial Data Analyst',
+    'Business Intelligence Analyst',
+    'Data Engineer',
+    'Data Architect',
+    'Analytics Engineer',
+    'ETL Developer',
+    'Machine Learning Engineer',
+    'Machine Learning Scientist',
+    'Research Scientist',
+    'AI Scientist',
+    'Computer Vision Engineer',
+    'NLP Engineer',
+    'Data Science Consultant',
+    'Data Specialist',
+    'Data Science Manager',
+    'Data Analytics Manager',
+    'Data Engineering Manager',
+    'Machine Learning Manager',
+    'Head of Data',
+    'Head of Data Science',
+    'Head of Machine Learning',
+    'Director of Data Science',
+    'Director of Data Engineering',
+]
+
+# Abbreviations and synonyms are expanded before matching, on both sides
+ALIASES = {
+    'ml': 'machine learning',
+    'ai': 'artificial intelligence',
+    'bi': 'business intelligence',
+    'nlp': 'natural language processing',
+    'finance': 'financial',
+    'developer': 'engineer',
+    'researcher': 'scientist',
+}
+# Seniority is already captured by experience_level, and these words only specialise a title
+MODIFIERS = {'senior', 'sr', 'junior', 'jr', 'lead', 'principal', 'staff', 'applied', 'big', 'cloud', 'software', '3d'}
+
+MIN_SIMILARITY = 0.5
+# Covers the taxonomy above and the matching code below
+TAXONOMY_VERSION = module_version(__name__)
+TITLE_MAP_CACHE_PATH = os.path.join(CACHE_DIR, 'title_map.pkl')
+
+
+def normalize_title(title: str) -> str:
+    tokens = re.findall(r'[a-z0-9]+', title.lower())
+    tokens = [ALIASES.get(token, token) for token in tokens if token not in MODIFIERS]
+    return ' '.join(tokens)
+
+
+def trigrams(text: str) -> set:
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """Character trigram index over the canonical titles.
+
+    A raw title is only compared with the canonical titles it shares a trigram with, and is
+    mapped to the one with the highest Dice similarity if that reaches ``MIN_SIMILARITY``.
+    Raw titles are matched once and remembered, so later calls only match unseen titles.
+    """
+
+    def __init__(self):
+        self.canonical_titles = list(CANONICAL_TITLES)
+        self.version = TAXONOMY_VERSION
+        self.exact = {}
+        self.postings = defaultdict(list)
+        self.sizes = []
+        for idx, title in enumerate(self.canonical_titles):
+            normalized = normalize_title(title)
+            self.exact[normalized] = idx
+            grams = trigrams(normalized)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(idx)
+        self.mapping = {}
+
+    def match(self, title: str) -> str:
+        normalized = normalize_title(title)
+        if normalized in self.exact:
+            return self.canonical_titles[self.exact[normalized]]
+
+        grams = trigrams(normalized)
+        overlaps = Counter(idx for gram in grams for idx in self.postings.get(gram, ()))
+        if not overlaps:
+            return title
+        scores = {idx: 2 * overlap / (len(grams) + self.sizes[idx]) for idx, overlap in overlaps.items()}
+        best = max(scores, key=scores.get)
+        return self.canonical_titles[best] if scores[best] >= MIN_SIMILARITY else title
+
+    def canonicalize(self, titles: pd.Series) -> pd.Series:
+        codes, uniques = pd.factorize(titles)
+        for title in uniques:
+            if title not in self.mapping:
+                self.mapping[title] = self.match(title)
+        # Missing titles get code -1, which points at the None appended last
+        canonical = np.array([self.mapping[title] for title in uniques] + [None], dtype=object)
+        return pd.Series(canonical[codes], index=titles.index, name=titles.name)
+
+
+def load_title_index(cache_path: str = TITLE_MAP_CACHE_PATH) -> TitleIndex:
+    cached = load_pickle(cache_path)
+    # A different taxonomy invalidates every remembered match
+    if isinstance(cached, TitleIndex) and cached.version == TAXONOMY_VERSION:
+        return cached
+    return TitleIndex()
+
+
+def save_title_index(index: TitleIndex, cache_path: str = TITLE_MAP_CACHE_PATH):
+    save_pickle(cache_path, index)
+
+
+def canonicalize_titles(titles: pd.Series, cache_path: str = TITLE_MAP_CACHE_PATH) -> pd.Series:
+    index = load_title_index(cache_path)
+    n_known = len(index.mapping)
+    canonical = index.canonicalize(titles)
+    if len(index.mapping) != n_known:
+        save_title_index(index, cache_path)
+    return canonical